@@ -0,0 +1,270 @@
+"""
+SC AI Lead Generation System - Message Response Cache
+Reuses generated variants across structurally similar leads
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from backend.database.db_manager import db_manager
+
+logger = logging.getLogger(__name__)
+
+NAME_PLACEHOLDER = '{NAME}'
+COMPANY_PLACEHOLDER = '{COMPANY}'
+
+# Words that don't change which title family a lead belongs to
+_TITLE_STOPWORDS = {'of', 'the', 'and', 'at', 'for', 'a', 'an'}
+_TITLE_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize_title(title: Optional[str]) -> str:
+    """Reduce a job title to its family, e.g. 'VP, Marketing & Growth' -> 'vp marketing growth'"""
+    if not title:
+        return ''
+    tokens = _TITLE_TOKEN_RE.findall(title.lower())
+    return ' '.join(t for t in tokens if t not in _TITLE_STOPWORDS)
+
+
+class StructuralMessageCache:
+    """
+    Cache of generated variants keyed on the structure of the lead
+    
+    Leads that share a persona, a title family and a message type get nearly
+    identical prompts. Variants are stored as templates with the lead's name and
+    company replaced by placeholders, and filled in for the next matching lead.
+    Recently used entries are also kept in memory so repeat hits within a batch
+    skip the database.
+    """
+    
+    def __init__(self, db=None, ttl_days: int = 30, memory_size: int = 512):
+        self.db = db or db_manager
+        self.ttl = timedelta(days=ttl_days)
+        self._table_ready = False
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0}
+    
+    def _ensure_table(self):
+        """Create the cache table on first use"""
+        if self._table_ready:
+            return
+        
+        with self.db.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS message_response_cache (
+                    struct_key TEXT PRIMARY KEY,
+                    persona_name TEXT,
+                    variant_a TEXT,
+                    variant_b TEXT,
+                    variant_c TEXT,
+                    created_at TEXT
+                )
+            """)
+        self._table_ready = True
+    
+    @staticmethod
+    def make_key(message_type: str,
+                 persona_name: Optional[str],
+                 lead_title: Optional[str],
+                 message_number: Optional[int] = None) -> str:
+        """Build the structural key for a lead and message type"""
+        return '|'.join([
+            message_type,
+            str(message_number or ''),
+            (persona_name or '').strip().lower(),
+            normalize_title(lead_title)
+        ])
+    
+    def get(self, key: str, lead_name: str, lead_company: str) -> Optional[Dict[str, str]]:
+        """Return cached variants filled in for this lead, or None on a miss"""
+        variants = self._lookup(key, lead_name, lead_company)
+        self.stats['hits' if variants else 'misses'] += 1
+        return variants
+    
+    def _lookup(self, key: str, lead_name: str, lead_company: str) -> Optional[Dict[str, str]]:
+        row = self._memory.get(key)
+        if row is not None:
+            self._memory.move_to_end(key)
+        else:
+            try:
+                self._ensure_table()
+                with self.db.get_connection() as conn:
+                    row = conn.execute(
+                        "SELECT persona_name, variant_a, variant_b, variant_c, created_at FROM message_response_cache WHERE struct_key = ?",
+                        (key,)
+                    ).fetchone()
+            except Exception as e:
+                logger.warning("⚠️ Message cache lookup failed: %s", e)
+                return None
+            
+            if not row:
+                return None
+            row = dict(row)
+            self._remember(key, row)
+        
+        if datetime.fromisoformat(row['created_at']) < datetime.now() - self.ttl:
+            self._memory.pop(key, None)
+            return None
+        
+        first_name = lead_name.split()[0] if lead_name else ''
+        return {
+            key_name: row[key_name].replace(NAME_PLACEHOLDER, first_name).replace(COMPANY_PLACEHOLDER, lead_company or '')
+            for key_name in ('variant_a', 'variant_b', 'variant_c')
+            if row[key_name]
+        }
+    
+    def set(self, key: str, variants: Dict[str, str], lead_name: str, lead_company: str, persona_name: str = None):
+        """Store variants as templates, swapping this lead's name and company for placeholders"""
+        templates = {
+            key_name: self._to_template(message, lead_name, lead_company)
+            for key_name, message in variants.items()
+        }
+        
+        row = {
+            'persona_name': (persona_name or '').strip().lower(),
+            'variant_a': templates.get('variant_a'),
+            'variant_b': templates.get('variant_b'),
+            'variant_c': templates.get('variant_c'),
+            'created_at': datetime.now().isoformat()
+        }
+        self._remember(key, row)
+        
+        try:
+            self._ensure_table()
+            with self.db.get_connection() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO message_response_cache (
+                        struct_key, persona_name, variant_a, variant_b, variant_c, created_at
+                    ) VALUES (?, ?, ?, ?, ?, ?)
+                """, (
+                    key,
+                    row['persona_name'],
+                    row['variant_a'],
+                    row['variant_b'],
+                    row['variant_c'],
+                    row['created_at']
+                ))
+        except Exception as e:
+            logger.warning("⚠️ Message cache write failed: %s", e)
+    
+    def _remember(self, key: str, row: Dict):
+        """Keep an entry in the in-memory tier, evicting the least recently used"""
+        self._memory[key] = row
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+    
+    def invalidate_persona(self, persona_name: str):
+        """Drop every cached entry generated for a persona (call after editing it)"""
+        persona_name = (persona_name or '').strip().lower()
+        for key in [k for k, row in self._memory.items() if row['persona_name'] == persona_name]:
+            del self._memory[key]
+        
+        try:
+            self._ensure_table()
+            with self.db.get_connection() as conn:
+                conn.execute(
+                    "DELETE FROM message_response_cache WHERE persona_name = ?",
+                    (persona_name,)
+                )
+        except Exception as e:
+            logger.warning("⚠️ Message cache invalidation failed: %s", e)
+    
+    @staticmethod
+    def _to_template(message: str, lead_name: str, lead_company: str) -> str:
+        """Replace lead-specific names in a generated message with placeholders"""
+        if lead_company:
+            message = re.sub(re.escape(lead_company), COMPANY_PLACEHOLDER, message, flags=re.IGNORECASE)
+        
+        if lead_name:
+            message = re.sub(re.escape(lead_name), NAME_PLACEHOLDER, message)
+            first_name = lead_name.split()[0]
+            message = re.sub(rf'\b{re.escape(first_name)}\b', NAME_PLACEHOLDER, message)
+        
+        return message
+
+
+class PromptResponseCache:
+    """
+    Exact prompt -> response cache for reruns
+    
+    Keyed on a BLAKE2b hash of the full request (model, sampling settings and
+    messages), so a retried or re-run pipeline gets the stored completions back
+    instead of paying for the same call again.
+    """
+    
+    def __init__(self, db=None, ttl_days: int = 30):
+        self.db = db or db_manager
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self._table_ready = False
+        self.stats = {'hits': 0, 'misses': 0}
+    
+    def _ensure_table(self):
+        """Create the cache table on first use and drop expired entries"""
+        if self._table_ready:
+            return
+        
+        with self.db.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key BLOB PRIMARY KEY,
+                    response TEXT,
+                    created_at INTEGER
+                )
+            """)
+            conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?",
+                (int(time.time()) - self.ttl_seconds,)
+            )
+        self._table_ready = True
+    
+    @staticmethod
+    def make_key(request: Dict) -> bytes:
+        """Hash the keyword arguments of a chat completion request"""
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest()
+    
+    def get(self, key: bytes) -> Optional[List[str]]:
+        """Return the stored completions for a request, or None on a miss"""
+        contents = self._lookup(key)
+        self.stats['hits' if contents is not None else 'misses'] += 1
+        return contents
+    
+    def _lookup(self, key: bytes) -> Optional[List[str]]:
+        try:
+            self._ensure_table()
+            with self.db.get_connection() as conn:
+                row = conn.execute(
+                    "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+        except Exception as e:
+            logger.warning("⚠️ Prompt cache lookup failed: %s", e)
+            return None
+        
+        if not row or row['created_at'] < int(time.time()) - self.ttl_seconds:
+            return None
+        return json.loads(row['response'])
+    
+    def set(self, key: bytes, contents: List[str]):
+        """Store the completions returned for a request"""
+        try:
+            self._ensure_table()
+            with self.db.get_connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(contents), int(time.time()))
+                )
+        except Exception as e:
+            logger.warning("⚠️ Prompt cache write failed: %s", e)
+
+
+# Singleton instances
+message_cache = StructuralMessageCache()
+prompt_cache = PromptResponseCache()
@@ -1,48 +1,781 @@
 """
 SC AI Lead Generation System - Message Generator
-GPT-4 powered personalized message generation for LinkedIn outreach
+OpenAI powered personalized message generation for LinkedIn outreach
 UPDATED FOR OPENAI SDK 1.0.0+
 """
 
+import asyncio
+import atexit
+import contextlib
+import functools
+import json
+import logging
 import os
+import random
+import re
 import sys
+import threading
+import time
 from pathlib import Path
-from typing import Dict, List, Optional
-from openai import OpenAI  # NEW: Import OpenAI client
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 
-# Add parent directory to path
-sys.path.append(str(Path(__file__).parent.parent))
+BACKEND_DIR = Path(__file__).parent.parent
+
+# Progress goes to this logger rather than stdout; warnings and errors still
+# reach stderr through logging's last-resort handler when nothing is configured.
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    # Run as a script: make the `backend` package importable
+    sys.path.append(str(BACKEND_DIR.parent))
 
 try:
     from backend.config import Config
-    from backend.database.db_manager import db_manager
-    USE_DATABASE = True
 except ImportError:
-    print("⚠️ Warning: Database modules not available")
-    USE_DATABASE = False
     class Config:
         pass
 
 
+@functools.lru_cache(maxsize=1)
+def _lazy_db():
+    """
+    Import the database manager on first use
+    
+    Keeps `import message_generator` cheap for callers that never touch the
+    database. Returns None when the database modules aren't available.
+    """
+    try:
+        from backend.database.db_manager import db_manager
+        return db_manager
+    except ImportError:
+        logger.warning("⚠️ Database modules not available")
+        return None
+
+
+@functools.lru_cache(maxsize=1)
+def _lazy_prompt_cache():
+    """The exact-prompt response cache, imported once (None without the database)"""
+    if _lazy_db() is None:
+        return None
+    from backend.ai_engine.message_cache import prompt_cache
+    return prompt_cache
+
+
+# Fallback copy used when the OpenAI call fails. Kept as (variant_key, template)
+# pairs so only the variants actually returned get formatted.
+FALLBACK_CONNECTION_TEMPLATES = (
+    ('variant_a', "Hi {lead_name}, I came across your profile and was impressed by your work at {lead_company}. I'd love to connect and exchange ideas about {lead_title} best practices."),
+    ('variant_b', "Hi {lead_name}, fellow professional here. Your experience at {lead_company} caught my attention. Would be great to connect!"),
+    ('variant_c', "Hi {lead_name}, I noticed we both work in similar spaces. Your role as {lead_title} is interesting - let's connect!"),
+)
+
+FALLBACK_FOLLOWUP_TEMPLATES = {
+    1: (
+        ('variant_a', "Hi {lead_name}, following up on my connection request. I think there could be some great synergies between what you're doing and what we offer. Would you be open to a quick chat?"),
+        ('variant_b', "Hey {lead_name}, wanted to reach out again. I've been following your work and think we could help with some of the challenges in {lead_title}. Interested in learning more?"),
+        ('variant_c', "{lead_name}, quick follow-up - we've helped several companies in your space improve their results. Would love to share some insights if you have 15 minutes this week?"),
+    ),
+    2: (
+        ('variant_a', "Hi {lead_name}, I know you're busy, but I wanted to make one more attempt to connect. We've seen great results helping companies like yours. Open to a brief call this week?"),
+        ('variant_b', "{lead_name}, final follow-up from me. If the timing isn't right now, no worries - but I'd hate for you to miss out on what we could potentially achieve together. Let me know!"),
+        ('variant_c', "Hi {lead_name}, last message from me! Just wanted to make sure you saw my previous notes. If you're interested in discussing how we can help, I'm here. Otherwise, I'll check back in a few months."),
+    ),
+}
+
+
+# Variants are sampled as independent completions of one request (n=3)
+VARIANT_KEYS = ('variant_a', 'variant_b', 'variant_c')
+
+# LinkedIn character limits and the matching completion budgets. English runs
+# ~4 characters per token, so chars // 3 leaves headroom without paying for
+# runaway output.
+CONNECTION_MAX_CHARS = 300
+FOLLOW_UP_MAX_CHARS = 500
+CONNECTION_MAX_TOKENS = CONNECTION_MAX_CHARS // 3
+FOLLOW_UP_MAX_TOKENS = FOLLOW_UP_MAX_CHARS // 3
+
+# Retry budget for transient API errors (rate limits, timeouts, 5xx)
+MAX_ATTEMPTS = 6
+MAX_BACKOFF_SECONDS = 30
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(30, 2 ** attempt)) seconds"""
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, 2 ** attempt))
+
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_SENTENCE_END_RE = re.compile(r'[.!?](?=\s|$)')
+
+# Static instructions go in the system message and lead details go last, so
+# every request for a message type shares the same prefix and the API's
+# automatic prompt caching can reuse it.
+CONNECTION_SYSTEM_PROMPT = (
+    "You write B2B LinkedIn connection requests. For the lead described, write one: "
+    f"max {CONNECTION_MAX_CHARS} chars; personalized to role and company; clear value; "
+    "warm, professional, not pushy; soft call-to-action. Reply with the message text only."
+)
+
+FOLLOW_UP_SYSTEM_PROMPT = (
+    "You write B2B LinkedIn follow-up messages. For the lead described, write one: "
+    f"max {FOLLOW_UP_MAX_CHARS} chars; reference their role/company; clear value; "
+    "work towards the stated goal; professional, personable, not generic. "
+    "Reply with the message text only."
+)
+
+# Shared, never mutated - every request sends the exact same system message object
+_SYS_CONNECTION = {"role": "system", "content": CONNECTION_SYSTEM_PROMPT}
+_SYS_FOLLOW_UP = {"role": "system", "content": FOLLOW_UP_SYSTEM_PROMPT}
+
+FOLLOW_UP_GOALS = {
+    1: "Ask insightful question to start dialogue",
+    2: "Clear call-to-action (meeting request)",
+}
+
+SEQUENCE_MESSAGE_TYPES = ('connection_request', 'follow_up_1', 'follow_up_2')
+
+SEQUENCE_SYSTEM_PROMPT = (
+    "You write B2B LinkedIn outreach sequences. For the lead described, write three "
+    "different variants (a, b, c) of each message: "
+    f"connection_request - max {CONNECTION_MAX_CHARS} chars, personalized, soft call-to-action; "
+    f"follow_up_1 - max {FOLLOW_UP_MAX_CHARS} chars, {FOLLOW_UP_GOALS[1].lower()}; "
+    f"follow_up_2 - max {FOLLOW_UP_MAX_CHARS} chars, builds on follow_up_1, {FOLLOW_UP_GOALS[2].lower()}. "
+    "Warm, professional, not generic or pushy."
+)
+_SYS_SEQUENCE = {"role": "system", "content": SEQUENCE_SYSTEM_PROMPT}
+
+_VARIANTS_SCHEMA = {
+    "type": "object",
+    "properties": {key: {"type": "string"} for key in VARIANT_KEYS},
+    "required": list(VARIANT_KEYS),
+    "additionalProperties": False
+}
+
+# Structured output for one message: variant -> text
+VARIANTS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "variants", "strict": True, "schema": _VARIANTS_SCHEMA}
+}
+
+# Structured output for the whole sequence: message type -> variant -> text
+SEQUENCE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "message_sequence",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {message_type: _VARIANTS_SCHEMA for message_type in SEQUENCE_MESSAGE_TYPES},
+            "required": list(SEQUENCE_MESSAGE_TYPES),
+            "additionalProperties": False
+        }
+    }
+}
+
+# Nine messages plus the JSON keys and punctuation around them
+SEQUENCE_MAX_TOKENS = len(VARIANT_KEYS) * (CONNECTION_MAX_TOKENS + 2 * FOLLOW_UP_MAX_TOKENS) + 120
+
+DEFAULT_MODEL = getattr(Config, 'MESSAGE_MODEL', 'gpt-4o-mini')
+HIGH_QUALITY_MODEL = getattr(Config, 'MESSAGE_MODEL_HIGH_QUALITY', 'gpt-4')
+
+# Persona descriptions longer than this count as extra context for model routing
+PREMIUM_PERSONA_CHARS = 400
+
+# generated_by for variants that didn't come from a model call: re-addressed
+# from the structural cache, or the canned copy used after an API failure
+GENERATED_BY_CACHE = 'cache'
+GENERATED_BY_FALLBACK = 'fallback'
+
+# Persona descriptions are cut to this many tokens in the prompt
+PERSONA_MAX_TOKENS = 150
+
+# Account rate limits reported by the warm-up probe, e.g. {'tokens_per_minute': 90000}
+_RATE_LIMITS: Dict[str, int] = {}
+
+# Connection pool size and timeouts for OpenAI HTTP clients
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE = 20
+HTTP_TIMEOUT_SECONDS = 60
+HTTP_CONNECT_TIMEOUT_SECONDS = 5
+
+
+def _http_client_options() -> Dict:
+    """Pool limits, timeouts and HTTP/2 (when the optional `h2` package is installed)"""
+    import httpx
+    
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    
+    return {
+        'http2': http2,
+        'limits': httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        'timeout': httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS)
+    }
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_http_client():
+    """
+    Connection pool shared by every sync OpenAI client in the process
+    
+    Generators, the warm-up client and ABCMessageGenerator all send through
+    it, so keep-alive connections are reused instead of each client paying
+    its own TLS handshake.
+    """
+    from openai import DefaultHttpxClient
+    
+    client = DefaultHttpxClient(**_http_client_options())
+    atexit.register(client.close)
+    return client
+
+
+def _async_http_client():
+    """
+    New async connection pool with the same limits as the sync one
+    
+    Async connections belong to the event loop that opened them, so a pool
+    must be opened and closed within one run on one loop (see
+    _async_openai_client); it is never reused across asyncio.run() calls.
+    """
+    from openai import DefaultAsyncHttpxClient
+    
+    return DefaultAsyncHttpxClient(**_http_client_options())
+
+
+_background_loop_lock = threading.Lock()
+_background_loop_instance: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop the sync wrappers run their coroutines on
+    
+    It runs in a daemon thread for the life of the process, so the async
+    connection pool opened on it (_shared_async_http_client) stays usable
+    from one sync call to the next and across generator instances.
+    """
+    global _background_loop_instance
+    with _background_loop_lock:
+        if _background_loop_instance is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='openai-async', daemon=True).start()
+            _background_loop_instance = loop
+        return _background_loop_instance
+
+
+def _run_sync(coro):
+    """Run a coroutine on the background loop and block until it returns"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
+    
+    coro.close()
+    raise RuntimeError("Sync generator methods can't be called from a running event loop; await the async version")
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_async_http_client():
+    """
+    Async connection pool shared by every run on the background loop
+    
+    Only used from that loop, which never closes, so its keep-alive
+    connections are reused by every sync call instead of each one paying
+    its own TLS handshake. Closed on the loop at interpreter exit.
+    """
+    client = _async_http_client()
+    
+    def close():
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), _background_loop()).result(timeout=5)
+        except Exception:
+            pass
+    
+    atexit.register(close)
+    return client
+
+
+@contextlib.asynccontextmanager
+async def _async_openai_client(api_key: str, aclient=None):
+    """
+    AsyncOpenAI client for one run on the running event loop
+    
+    Async connections belong to the loop that opened them, so the client and
+    its pool are opened here and closed before the run (and its loop) ends,
+    never kept for a later asyncio.run(). Runs on the background loop use
+    its shared pool instead, which outlives them. Passing `aclient` reuses a
+    client the caller already opened for this run.
+    """
+    if aclient is not None:
+        yield aclient
+        return
+    
+    from openai import AsyncOpenAI
+    
+    if asyncio.get_running_loop() is _background_loop_instance:
+        # Only the thin client wrapper is per run; closing it would close the shared pool
+        yield AsyncOpenAI(api_key=api_key, max_retries=0, http_client=_shared_async_http_client())
+        return
+    
+    async with AsyncOpenAI(api_key=api_key, max_retries=0, http_client=_async_http_client()) as aclient:
+        yield aclient
+
+
+def _warm_up_client():
+    """
+    Create a shared OpenAI client and send a 1-token probe in the background
+    
+    The probe opens the connection to the API before the first real request
+    and records the account's rate limits from the response headers.
+    """
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        return None
+    
+    from openai import OpenAI
+    
+    client = OpenAI(api_key=api_key, max_retries=0, http_client=_shared_http_client())
+    
+    def probe():
+        try:
+            raw = client.chat.completions.with_raw_response.create(
+                model=DEFAULT_MODEL,
+                messages=[{"role": "user", "content": "ping"}],
+                max_tokens=1
+            )
+            for header, key in (('x-ratelimit-limit-tokens', 'tokens_per_minute'),
+                                ('x-ratelimit-limit-requests', 'requests_per_minute')):
+                value = raw.headers.get(header)
+                if value and value.isdigit():
+                    _RATE_LIMITS[key] = int(value)
+        except Exception as e:
+            logger.warning("⚠️ OpenAI warm-up probe failed: %s", e)
+    
+    threading.Thread(target=probe, daemon=True).start()
+    return client
+
+
+_warm_client = _warm_up_client() if os.getenv('OPENAI_WARMUP') == '1' else None
+
+
+def _count_tokens(text: str) -> int:
+    """Estimate the token count of a prompt (tiktoken when installed, else ~4 chars/token)"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+@functools.lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(DEFAULT_MODEL)
+    except Exception:
+        return None
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens (~4 chars each without tiktoken), ending on a whole word"""
+    encoding = _get_encoding()
+    if encoding is None:
+        if len(text) <= max_tokens * 4:
+            return text
+        head = text[:max_tokens * 4]
+    else:
+        token_ids = encoding.encode(text)
+        if len(token_ids) <= max_tokens:
+            return text
+        head = encoding.decode(token_ids[:max_tokens])
+    return head.rsplit(' ', 1)[0].rstrip(',;:-')
+
+
+@functools.lru_cache(maxsize=64)
+def _persona_lines(persona_name: Optional[str], persona_description: Optional[str]) -> Tuple[str, ...]:
+    """
+    Persona lines of a user prompt, built once per persona
+    
+    Leads share a handful of personas, so this skips re-tokenizing the same
+    description for every lead. Keyed on the text rather than the persona
+    ID, so an edited persona gets a fresh entry.
+    """
+    lines = []
+    if persona_name:
+        lines.append(f"Persona: {persona_name}")
+    if persona_description:
+        lines.append(f"Persona context: {_truncate_tokens(persona_description, PERSONA_MAX_TOKENS)}")
+    return tuple(lines)
+
+
+# Chat format adds a few tokens per message on top of its content
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@functools.lru_cache(maxsize=8)
+def _static_prompt_tokens(text: str) -> int:
+    """Token count of a fixed system prompt, encoded once per process"""
+    return _count_tokens(text)
+
+
+def _estimate_request_tokens(messages: List[Dict[str, str]], max_tokens: int, n: int = len(VARIANT_KEYS)) -> int:
+    """Worst-case tokens a request can use: the prompt plus max_tokens for each of `n` choices"""
+    prompt_tokens = sum(
+        _MESSAGE_OVERHEAD_TOKENS + (
+            _static_prompt_tokens(m['content']) if m['role'] == 'system' else _count_tokens(m['content'])
+        )
+        for m in messages
+    )
+    return prompt_tokens + max_tokens * n
+
+
+class _RateLimiter:
+    """Token bucket for requests-per-minute and tokens-per-minute limits"""
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.max_requests = requests_per_minute
+        self.max_tokens = tokens_per_minute
+        self.available_requests = float(requests_per_minute)
+        self.available_tokens = float(tokens_per_minute)
+        self.last_update = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self, tokens: int):
+        """Wait until one request and `tokens` tokens of capacity are available"""
+        tokens = min(tokens, self.max_tokens)
+        
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                elapsed = now - self.last_update
+                self.last_update = now
+                
+                self.available_requests = min(
+                    self.max_requests, self.available_requests + self.max_requests * elapsed / 60
+                )
+                self.available_tokens = min(
+                    self.max_tokens, self.available_tokens + self.max_tokens * elapsed / 60
+                )
+                
+                if self.available_requests >= 1 and self.available_tokens >= tokens:
+                    self.available_requests -= 1
+                    self.available_tokens -= tokens
+                    return
+                
+                await asyncio.sleep(0.05)
+
+
 class MessageGenerator:
-    """Generate personalized LinkedIn messages using GPT-4"""
+    """Generate personalized LinkedIn messages using OpenAI chat models"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self,
+                 api_key: str = None,
+                 use_cache: bool = False,
+                 high_quality: bool = False,
+                 model: str = None,
+                 deterministic: bool = False,
+                 premium_model: str = None,
+                 http_client=None):
         """
         Initialize message generator
         
         Args:
             api_key: OpenAI API key (defaults to environment variable)
+            use_cache: Reuse variants generated for leads with the same persona
+                and title family (see message_cache)
+            high_quality: Use the larger model (Config.MESSAGE_MODEL_HIGH_QUALITY),
+                e.g. for premium personas
+            model: Explicit model name, overrides both defaults
+            deterministic: Return the stored completions for a prompt that was
+                sent before instead of sampling again (reruns, dev testing).
+                Always on when temperature is 0.
+            premium_model: When set, connection requests with custom context or
+                a long persona description are routed to this model; everything
+                else uses the draft model above
+            http_client: httpx client for sync calls, owned by this generator
+                and closed by close(); defaults to the process-wide shared pool
         """
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
         if not self.api_key:
             raise ValueError("OpenAI API key is required. Set OPENAI_API_KEY environment variable.")
         
-        # NEW: Initialize OpenAI client
-        self.client = OpenAI(api_key=self.api_key)
-        self.model = "gpt-4"
-        self.temperature = 0.7
+        # Imported here rather than at module level - the SDK is slow to import
+        import openai
+        self._openai = openai
+        
+        # Reuse the pre-warmed client when it was built for the same key
+        self._owns_http_client = http_client is not None
+        if _warm_client is not None and _warm_client.api_key == self.api_key and not self._owns_http_client:
+            self.client = _warm_client
+        else:
+            self.client = openai.OpenAI(api_key=self.api_key, max_retries=0,
+                                        http_client=http_client or _shared_http_client())
+        self.model = model or (HIGH_QUALITY_MODEL if high_quality else DEFAULT_MODEL)
+        self.premium_model = premium_model
+        self.temperature = 0.9
+        self.deterministic = deterministic
+        
+        self.cache = None
+        if use_cache and _lazy_db() is not None:
+            from backend.ai_engine.message_cache import message_cache
+            self.cache = message_cache
+    
+    def close(self):
+        """
+        Close this generator's sync client and forget the cached generators
+        
+        A client built on the shared pool (or the warm-up client) is left
+        open, since other generators send through the same connections; the
+        shared pools are closed at exit. Async clients are opened per run and
+        are already closed. Clears _get_generator, so tests can call close()
+        to reset the per-key singletons and get fresh generators afterwards.
+        """
+        if self._owns_http_client:
+            self.client.close()
+        _get_generator.cache_clear()
+    
+    def _build_connection_prompt(self,
+                                 lead_name: str,
+                                 lead_title: str,
+                                 lead_company: str,
+                                 persona_name: str = None,
+                                 persona_description: str = None,
+                                 custom_context: str = None) -> List[Dict[str, str]]:
+        """Build the chat messages for a connection request"""
+        
+        parts = [
+            f"Name: {lead_name}",
+            f"Title: {lead_title}",
+            f"Company: {lead_company}"
+        ]
+        parts.extend(_persona_lines(persona_name, persona_description))
+        if custom_context:
+            parts.append(f"Context: {custom_context}")
+        
+        return [
+            _SYS_CONNECTION,
+            {"role": "user", "content": "\n".join(parts)}
+        ]
+    
+    def _build_follow_up_prompt(self,
+                                lead_name: str,
+                                lead_title: str,
+                                lead_company: str,
+                                persona_name: str = None,
+                                message_number: int = 1,
+                                previous_message: str = None) -> List[Dict[str, str]]:
+        """Build the chat messages for a follow-up message"""
+        
+        parts = [
+            f"Follow-up #{message_number} goal: {FOLLOW_UP_GOALS[1 if message_number == 1 else 2]}",
+            f"Name: {lead_name}",
+            f"Title: {lead_title}",
+            f"Company: {lead_company}"
+        ]
+        parts.extend(_persona_lines(persona_name, None))
+        if previous_message:
+            parts.append(f"Previous message: {previous_message}")
+        
+        return [
+            _SYS_FOLLOW_UP,
+            {"role": "user", "content": "\n".join(parts)}
+        ]
+    
+    def _cache_key(self,
+                   message_type: str,
+                   persona_name: Optional[str],
+                   lead_title: Optional[str],
+                   message_number: int = None,
+                   custom_context: str = None) -> Optional[str]:
+        """Structural cache key, or None when caching is off or the prompt has one-off context"""
+        if self.cache is None or custom_context:
+            return None
+        return self.cache.make_key(message_type, persona_name, lead_title, message_number)
+    
+    def _cache_get(self, cache_key: Optional[str], lead_name: str, lead_company: str) -> Optional[Dict[str, str]]:
+        """Look up cached variants for this lead"""
+        if cache_key is None:
+            return None
+        return self.cache.get(cache_key, lead_name, lead_company)
+    
+    def _cache_set(self,
+                   cache_key: Optional[str],
+                   variants: Dict[str, str],
+                   lead_name: str,
+                   lead_company: str,
+                   persona_name: str = None):
+        """Store freshly generated variants as templates for similar leads"""
+        if cache_key is not None and len(variants) == len(VARIANT_KEYS):
+            self.cache.set(cache_key, variants, lead_name, lead_company, persona_name)
+    
+    def route_model(self, persona_description: str = None, custom_context: str = None) -> str:
+        """
+        Model a connection request with this context is sent to
+        
+        The premium model for prompts with extra context, the draft model
+        otherwise. What was actually used for a set of variants is reported
+        through the `models` argument of the generate methods.
+        """
+        if self.premium_model and (custom_context or len(persona_description or '') > PREMIUM_PERSONA_CHARS):
+            return self.premium_model
+        return self.model
+    
+    @staticmethod
+    def _record_model(models: Optional[Dict[str, str]], message_type: str, generated_by: str):
+        """Note where a message type's variants came from, for generated_by"""
+        if models is not None:
+            models[message_type] = generated_by
+    
+    def _completion_request(self,
+                            messages: List[Dict[str, str]],
+                            max_tokens: int,
+                            model: str = None,
+                            **overrides) -> Dict:
+        """Keyword arguments for one chat completion sampling every variant"""
+        return {
+            'model': model or self.model,
+            'messages': messages,
+            'temperature': self.temperature,
+            'max_tokens': max_tokens,
+            'n': len(VARIANT_KEYS),
+            **overrides
+        }
+    
+    def _prompt_cache(self):
+        """The exact-prompt response cache, when this generator should use it"""
+        if not (self.deterministic or self.temperature == 0):
+            return None
+        return _lazy_prompt_cache()
+    
+    def _transient_errors(self) -> Tuple:
+        """API errors worth retrying: rate limits, timeouts, dropped connections, 5xx"""
+        return (self._openai.RateLimitError, self._openai.APIConnectionError,
+                self._openai.APITimeoutError, self._openai.InternalServerError)
+    
+    def _complete(self,
+                  messages: List[Dict[str, str]],
+                  max_tokens: int,
+                  model: str = None,
+                  **overrides) -> List[str]:
+        """
+        Run a chat completion (or replay a cached one) and return each choice's text
+        
+        Transient errors are retried with exponential backoff and full jitter;
+        the last error is raised once MAX_ATTEMPTS is used up. Keyword
+        `overrides` replace fields of the default request.
+        """
+        request = self._completion_request(messages, max_tokens, model, **overrides)
+        prompt_cache = self._prompt_cache()
+        key = prompt_cache.make_key(request) if prompt_cache else None
+        
+        contents = prompt_cache.get(key) if key else None
+        if contents is not None:
+            return contents
+        
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                response = self.client.chat.completions.create(**request)
+                break
+            except self._transient_errors() as e:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                delay = _backoff_delay(attempt)
+                logger.warning("⚠️ %s on attempt %d/%d, retrying in %.1fs",
+                               type(e).__name__, attempt, MAX_ATTEMPTS, delay)
+                time.sleep(delay)
+        
+        contents = [choice.message.content for choice in response.choices]
+        if key:
+            prompt_cache.set(key, contents)
+        return contents
+    
+    async def _acomplete(self,
+                         aclient,
+                         messages: List[Dict[str, str]],
+                         max_tokens: int,
+                         limiter: _RateLimiter = None,
+                         model: str = None) -> List[str]:
+        """Async version of _complete, sent through `aclient`; waits on `limiter` (if given) before every attempt"""
+        request = self._completion_request(messages, max_tokens, model)
+        prompt_cache = self._prompt_cache()
+        key = prompt_cache.make_key(request) if prompt_cache else None
+        
+        contents = prompt_cache.get(key) if key else None
+        if contents is not None:
+            return contents
+        
+        response = await self._acreate(aclient, request, limiter, _estimate_request_tokens(messages, max_tokens))
+        
+        contents = [choice.message.content for choice in response.choices]
+        if key:
+            prompt_cache.set(key, contents)
+        return contents
+    
+    async def _acreate(self, aclient, request: Dict, limiter: _RateLimiter = None, estimated_tokens: int = 0):
+        """Send a chat completion request through `aclient`, retrying transient errors with jittered backoff"""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            if limiter is not None:
+                await limiter.acquire(estimated_tokens)
+            try:
+                return await aclient.chat.completions.create(**request)
+            except self._transient_errors() as e:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                delay = _backoff_delay(attempt)
+                logger.warning("⚠️ %s on attempt %d/%d, retrying in %.1fs",
+                               type(e).__name__, attempt, MAX_ATTEMPTS, delay)
+                await asyncio.sleep(delay)
+    
+    async def _astream_variants(self,
+                                aclient,
+                                messages: List[Dict[str, str]],
+                                max_tokens: int,
+                                max_chars: int,
+                                model: str = None) -> AsyncIterator[Tuple[str, str]]:
+        """Stream a completion and yield (variant_key, message) as each sampled choice finishes"""
+        if self._prompt_cache() is not None:
+            # Replaying stored responses - nothing to stream
+            variants = self._finalize_variants(await self._acomplete(aclient, messages, max_tokens, model=model), max_chars)
+            for item in variants.items():
+                yield item
+            return
+        
+        stream = await self._acreate(aclient, {**self._completion_request(messages, max_tokens, model), 'stream': True})
+        parts: Dict[int, List[str]] = {}
+        
+        async for chunk in stream:
+            for choice in chunk.choices:
+                parts.setdefault(choice.index, []).append(choice.delta.content or '')
+                if choice.finish_reason is not None and choice.index < len(VARIANT_KEYS):
+                    yield VARIANT_KEYS[choice.index], self._clean_message(''.join(parts.pop(choice.index)), max_chars)
+    
+    def _finalize_variants(self, contents: List[str], max_chars: int) -> Dict[str, str]:
+        """Map the sampled completions to variants and enforce the character limit"""
+        return {
+            key: self._clean_message(content, max_chars)
+            for key, content in zip(VARIANT_KEYS, contents)
+        }
+    
+    def _clean_message(self, content: str, max_chars: int) -> str:
+        """Collapse whitespace, strip wrapping quotes and enforce the character limit"""
+        message = _WHITESPACE_RE.sub(' ', content).strip().strip('"')
+        
+        if len(message) > max_chars:
+            message = self._trim_to_limit(message, max_chars)
+        
+        return message
+    
+    @staticmethod
+    def _trim_to_limit(message: str, max_chars: int) -> str:
+        """Cut an over-long message back to its last complete sentence (or word) within the limit"""
+        head = message[:max_chars]
+        sentence_ends = [m.end() for m in _SENTENCE_END_RE.finditer(head)]
+        if sentence_ends and sentence_ends[-1] >= max_chars // 2:
+            return head[:sentence_ends[-1]]
+        return head.rsplit(' ', 1)[0].rstrip(',;:-')
     
     def generate_connection_request(self, 
                                    lead_name: str,
@@ -50,7 +783,8 @@ class MessageGenerator:
                                    lead_company: str,
                                    persona_name: str = None,
                                    persona_description: str = None,
-                                   custom_context: str = None) -> Dict[str, str]:
+                                   custom_context: str = None,
+                                   models: Dict[str, str] = None) -> Dict[str, str]:
         """
         Generate a personalized LinkedIn connection request message
         
@@ -61,83 +795,126 @@ class MessageGenerator:
             persona_name: Target persona name (e.g., "Marketing Agencies")
             persona_description: Additional persona context
             custom_context: Any additional context to include
+            models: When given, models['connection_request'] is set to the
+                generated_by value for the result: the model the request was
+                routed to, GENERATED_BY_CACHE or GENERATED_BY_FALLBACK
             
         Returns:
             Dict with 3 message variants (A, B, C)
         """
         
-        # Build the prompt
-        prompt = f"""You are an expert B2B sales copywriter specializing in LinkedIn outreach.
-
-Generate 3 variations of a LinkedIn connection request message for the following lead:
-
-**Lead Information:**
-- Name: {lead_name}
-- Title: {lead_title}
-- Company: {lead_company}
-{f"- Target Persona: {persona_name}" if persona_name else ""}
-{f"- Persona Context: {persona_description}" if persona_description else ""}
-{f"- Additional Context: {custom_context}" if custom_context else ""}
-
-**Requirements:**
-1. Maximum 300 characters (LinkedIn connection request limit)
-2. Personalized to their role and company
-3. Clear value proposition
-4. Professional but warm tone
-5. No pushy sales language
-6. End with a soft call-to-action
-
-**Generate 3 variants:**
-- Variant A: Direct and value-focused
-- Variant B: Curiosity-driven and conversational
-- Variant C: Authority-based with social proof
-
-Format your response EXACTLY like this:
-
-VARIANT_A:
-[message text here]
-
-VARIANT_B:
-[message text here]
-
-VARIANT_C:
-[message text here]
-"""
+        cache_key = self._cache_key('connection_request', persona_name, lead_title, custom_context=custom_context)
+        cached = self._cache_get(cache_key, lead_name, lead_company)
+        if cached:
+            self._record_model(models, 'connection_request', GENERATED_BY_CACHE)
+            return cached
         
+        messages = self._build_connection_prompt(
+            lead_name, lead_title, lead_company, persona_name, persona_description, custom_context
+        )
+        
+        model = self.route_model(persona_description, custom_context)
         try:
-            # NEW: Updated API call syntax
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert LinkedIn copywriter focused on high-conversion connection requests."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=self.temperature,
-                max_tokens=500
-            )
-            
-            # NEW: Updated response access
-            content = response.choices[0].message.content.strip()
-            variants = self._parse_variants(content)
-            
-            # Validate character limits
-            for key, message in variants.items():
-                if len(message) > 300:
-                    variants[key] = message[:297] + "..."
-            
+            contents = self._complete(messages, CONNECTION_MAX_TOKENS, model)
+            variants = self._finalize_variants(contents, CONNECTION_MAX_CHARS)
+            self._cache_set(cache_key, variants, lead_name, lead_company, persona_name)
+            self._record_model(models, 'connection_request', model)
             return variants
         
         except Exception as e:
-            print(f"❌ Error generating connection request: {str(e)}")
+            logger.error("❌ Error generating connection request: %s", e)
+            self._record_model(models, 'connection_request', GENERATED_BY_FALLBACK)
             return self._get_fallback_messages(lead_name, lead_title, lead_company)
     
+    async def agenerate_connection_request(self,
+                                           lead_name: str,
+                                           lead_title: str,
+                                           lead_company: str,
+                                           persona_name: str = None,
+                                           persona_description: str = None,
+                                           custom_context: str = None,
+                                           aclient=None,
+                                           models: Dict[str, str] = None) -> Dict[str, str]:
+        """Async version of generate_connection_request (`aclient`: the run's AsyncOpenAI client, opened if not given)"""
+        
+        cache_key = self._cache_key('connection_request', persona_name, lead_title, custom_context=custom_context)
+        cached = self._cache_get(cache_key, lead_name, lead_company)
+        if cached:
+            self._record_model(models, 'connection_request', GENERATED_BY_CACHE)
+            return cached
+        
+        messages = self._build_connection_prompt(
+            lead_name, lead_title, lead_company, persona_name, persona_description, custom_context
+        )
+        
+        model = self.route_model(persona_description, custom_context)
+        try:
+            async with _async_openai_client(self.api_key, aclient) as aclient:
+                contents = await self._acomplete(aclient, messages, CONNECTION_MAX_TOKENS, model=model)
+            variants = self._finalize_variants(contents, CONNECTION_MAX_CHARS)
+            self._cache_set(cache_key, variants, lead_name, lead_company, persona_name)
+            self._record_model(models, 'connection_request', model)
+            return variants
+        
+        except Exception as e:
+            logger.error("❌ Error generating connection request: %s", e)
+            self._record_model(models, 'connection_request', GENERATED_BY_FALLBACK)
+            return self._get_fallback_messages(lead_name, lead_title, lead_company)
+    
+    async def astream_connection_request(self,
+                                         lead_name: str,
+                                         lead_title: str,
+                                         lead_company: str,
+                                         persona_name: str = None,
+                                         persona_description: str = None,
+                                         custom_context: str = None,
+                                         aclient=None) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Streaming version of generate_connection_request
+        
+        `aclient` is the run's AsyncOpenAI client; one is opened if not given.
+        
+        Yields:
+            (variant_key, message) tuples, each as soon as that variant is done
+        """
+        
+        cache_key = self._cache_key('connection_request', persona_name, lead_title, custom_context=custom_context)
+        cached = self._cache_get(cache_key, lead_name, lead_company)
+        if cached:
+            for item in cached.items():
+                yield item
+            return
+        
+        messages = self._build_connection_prompt(
+            lead_name, lead_title, lead_company, persona_name, persona_description, custom_context
+        )
+        
+        variants = {}
+        try:
+            async with _async_openai_client(self.api_key, aclient) as aclient:
+                async for variant_key, message in self._astream_variants(
+                    aclient, messages, CONNECTION_MAX_TOKENS, CONNECTION_MAX_CHARS,
+                    self.route_model(persona_description, custom_context)
+                ):
+                    variants[variant_key] = message
+                    yield variant_key, message
+        except Exception as e:
+            logger.error("❌ Error generating connection request: %s", e)
+            for variant_key, message in self._get_fallback_messages(lead_name, lead_title, lead_company).items():
+                if variant_key not in variants:
+                    yield variant_key, message
+            return
+        
+        self._cache_set(cache_key, variants, lead_name, lead_company, persona_name)
+    
     def generate_follow_up_message(self,
                                   lead_name: str,
                                   lead_title: str,
                                   lead_company: str,
                                   persona_name: str = None,
                                   message_number: int = 1,
-                                  previous_message: str = None) -> Dict[str, str]:
+                                  previous_message: str = None,
+                                  models: Dict[str, str] = None) -> Dict[str, str]:
         """
         Generate personalized follow-up message
         
@@ -148,80 +925,126 @@ VARIANT_C:
             persona_name: Target persona
             message_number: Which follow-up (1 or 2)
             previous_message: Previous message in sequence
+            models: When given, models['follow_up_<message_number>'] is set to
+                the generated_by value for the result (see
+                generate_connection_request)
             
         Returns:
             Dict with 3 message variants
         """
         
-        prompt = f"""You are an expert B2B sales copywriter specializing in LinkedIn follow-ups.
-
-Generate 3 variations of follow-up message #{message_number} for:
-
-**Lead Information:**
-- Name: {lead_name}
-- Title: {lead_title}
-- Company: {lead_company}
-{f"- Target Persona: {persona_name}" if persona_name else ""}
-{f"- Previous Message: {previous_message}" if previous_message else ""}
-
-**Requirements:**
-1. Maximum 500 characters
-2. Reference their role/company specifically
-3. Provide clear value proposition
-4. {"Ask insightful question to start dialogue" if message_number == 1 else "Clear call-to-action (meeting request)"}
-5. Professional but personable tone
-6. No generic templates
-
-**Generate 3 variants:**
-- Variant A: Value-focused with specific benefit
-- Variant B: Problem-solution approach
-- Variant C: Case study or social proof angle
-
-Format your response EXACTLY like this:
-
-VARIANT_A:
-[message text here]
-
-VARIANT_B:
-[message text here]
-
-VARIANT_C:
-[message text here]
-"""
+        message_type = f'follow_up_{message_number}'
+        cache_key = self._cache_key('follow_up', persona_name, lead_title, message_number)
+        cached = self._cache_get(cache_key, lead_name, lead_company)
+        if cached:
+            self._record_model(models, message_type, GENERATED_BY_CACHE)
+            return cached
+        
+        messages = self._build_follow_up_prompt(
+            lead_name, lead_title, lead_company, persona_name, message_number, previous_message
+        )
         
         try:
-            # NEW: Updated API call syntax
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert LinkedIn copywriter focused on high-conversion follow-up messages."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=self.temperature,
-                max_tokens=800
-            )
-            
-            # NEW: Updated response access
-            content = response.choices[0].message.content.strip()
-            variants = self._parse_variants(content)
-            
-            # Validate character limits
-            for key, message in variants.items():
-                if len(message) > 500:
-                    variants[key] = message[:497] + "..."
-            
+            contents = self._complete(messages, FOLLOW_UP_MAX_TOKENS)
+            variants = self._finalize_variants(contents, FOLLOW_UP_MAX_CHARS)
+            self._cache_set(cache_key, variants, lead_name, lead_company, persona_name)
+            self._record_model(models, message_type, self.model)
             return variants
         
         except Exception as e:
-            print(f"❌ Error generating follow-up message: {str(e)}")
+            logger.error("❌ Error generating follow-up message: %s", e)
+            self._record_model(models, message_type, GENERATED_BY_FALLBACK)
             return self._get_fallback_followup_messages(lead_name, lead_title, message_number)
     
+    async def agenerate_follow_up_message(self,
+                                          lead_name: str,
+                                          lead_title: str,
+                                          lead_company: str,
+                                          persona_name: str = None,
+                                          message_number: int = 1,
+                                          previous_message: str = None,
+                                          aclient=None,
+                                          models: Dict[str, str] = None) -> Dict[str, str]:
+        """Async version of generate_follow_up_message (`aclient`: the run's AsyncOpenAI client, opened if not given)"""
+        
+        message_type = f'follow_up_{message_number}'
+        cache_key = self._cache_key('follow_up', persona_name, lead_title, message_number)
+        cached = self._cache_get(cache_key, lead_name, lead_company)
+        if cached:
+            self._record_model(models, message_type, GENERATED_BY_CACHE)
+            return cached
+        
+        messages = self._build_follow_up_prompt(
+            lead_name, lead_title, lead_company, persona_name, message_number, previous_message
+        )
+        
+        try:
+            async with _async_openai_client(self.api_key, aclient) as aclient:
+                contents = await self._acomplete(aclient, messages, FOLLOW_UP_MAX_TOKENS)
+            variants = self._finalize_variants(contents, FOLLOW_UP_MAX_CHARS)
+            self._cache_set(cache_key, variants, lead_name, lead_company, persona_name)
+            self._record_model(models, message_type, self.model)
+            return variants
+        
+        except Exception as e:
+            logger.error("❌ Error generating follow-up message: %s", e)
+            self._record_model(models, message_type, GENERATED_BY_FALLBACK)
+            return self._get_fallback_followup_messages(lead_name, lead_title, message_number)
+    
+    async def astream_follow_up_message(self,
+                                        lead_name: str,
+                                        lead_title: str,
+                                        lead_company: str,
+                                        persona_name: str = None,
+                                        message_number: int = 1,
+                                        previous_message: str = None,
+                                        aclient=None) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Streaming version of generate_follow_up_message
+        
+        `aclient` is the run's AsyncOpenAI client; one is opened if not given.
+        
+        Yields:
+            (variant_key, message) tuples, each as soon as that variant is done
+        """
+        
+        cache_key = self._cache_key('follow_up', persona_name, lead_title, message_number)
+        cached = self._cache_get(cache_key, lead_name, lead_company)
+        if cached:
+            for item in cached.items():
+                yield item
+            return
+        
+        messages = self._build_follow_up_prompt(
+            lead_name, lead_title, lead_company, persona_name, message_number, previous_message
+        )
+        
+        variants = {}
+        try:
+            async with _async_openai_client(self.api_key, aclient) as aclient:
+                async for variant_key, message in self._astream_variants(
+                    aclient, messages, FOLLOW_UP_MAX_TOKENS, FOLLOW_UP_MAX_CHARS
+                ):
+                    variants[variant_key] = message
+                    yield variant_key, message
+        except Exception as e:
+            logger.error("❌ Error generating follow-up message: %s", e)
+            for variant_key, message in self._get_fallback_followup_messages(lead_name, lead_title, message_number).items():
+                if variant_key not in variants:
+                    yield variant_key, message
+            return
+        
+        self._cache_set(cache_key, variants, lead_name, lead_company, persona_name)
+    
     def generate_all_messages(self,
                              lead_id: int,
                              save_to_db: bool = True) -> Dict[str, Dict[str, str]]:
         """
         Generate complete message sequence for a lead
         
+        Sync wrapper around generate_all_messages_async, run on the shared
+        background loop so repeat calls reuse its connections.
+        
         Args:
             lead_id: Database ID of the lead
             save_to_db: Whether to save messages to database
@@ -229,134 +1052,542 @@ VARIANT_C:
         Returns:
             Dict with all message types and variants
         """
+        return _run_sync(self.generate_all_messages_async(lead_id, save_to_db=save_to_db))
+    
+    async def generate_all_messages_async(self,
+                                          lead_id: int,
+                                          save_to_db: bool = True) -> Dict[str, Dict[str, str]]:
+        """
+        Generate complete message sequence for a lead
+        
+        The connection request and first follow-up are generated concurrently;
+        the second follow-up waits for the first since it builds on it. While
+        it generates, the first two are inserted in a worker thread; the second
+        follow-up is then added to the same transaction and committed, so a
+        lead never ends up with a partial sequence.
         
-        if not USE_DATABASE:
+        Args:
+            lead_id: Database ID of the lead
+            save_to_db: Whether to save messages to database
+            
+        Returns:
+            Dict with all message types and variants
+        """
+        
+        db_manager = _lazy_db()
+        if db_manager is None:
             raise ValueError("Database access required for this function")
         
-        # Get lead from database
-        lead = db_manager.get_lead_by_id(lead_id)
+        # Get lead from database (off the loop, which may be the shared background one)
+        lead = await asyncio.to_thread(db_manager.get_lead_by_id, lead_id)
         
         if not lead:
             raise ValueError(f"Lead {lead_id} not found")
         
-        print(f"\n🎨 Generating messages for: {lead['name']}")
-        print(f"   Title: {lead['title']}")
-        print(f"   Company: {lead['company']}")
+        logger.info("🎨 Generating messages for: %s (%s, %s)", lead['name'], lead['title'], lead['company'])
         
-        # Get persona information
+        # Persona fields come joined onto the lead row
         persona_name = lead.get('persona_name')
-        persona_description = None
-        
-        if lead.get('persona_id'):
-            personas = db_manager.get_all_personas()
-            persona = next((p for p in personas if p['id'] == lead['persona_id']), None)
-            if persona:
-                persona_description = persona.get('description')
+        persona_description = lead.get('persona_description')
         
         messages = {}
+        models = {}
+        
+        # Insert of the first two message types, left open for the last one
+        first_insert = None
+        
+        try:
+            # One client for the run, closed before this event loop ends
+            async with _async_openai_client(self.api_key) as aclient:
+                # 1 + 2. Connection Request and First Follow-Up
+                logger.debug("📝 Generating connection request and first follow-up...")
+                messages['connection_request'], messages['follow_up_1'] = await asyncio.gather(
+                    self.agenerate_connection_request(
+                        lead_name=lead['name'],
+                        lead_title=lead['title'],
+                        lead_company=lead['company'],
+                        persona_name=persona_name,
+                        persona_description=persona_description,
+                        aclient=aclient,
+                        models=models
+                    ),
+                    self.agenerate_follow_up_message(
+                        lead_name=lead['name'],
+                        lead_title=lead['title'],
+                        lead_company=lead['company'],
+                        persona_name=persona_name,
+                        message_number=1,
+                        aclient=aclient,
+                        models=models
+                    )
+                )
+                logger.debug("✅ Done")
+                
+                if save_to_db:
+                    # Insert the first two while the last one generates; committed with it below
+                    first_rows = self._message_rows(lead_id, dict(messages), models)
+                    first_insert = asyncio.ensure_future(asyncio.to_thread(db_manager.begin_messages_bulk, first_rows))
+                
+                # 3. Second Follow-Up
+                logger.debug("📝 Generating second follow-up...")
+                messages['follow_up_2'] = await self.agenerate_follow_up_message(
+                    lead_name=lead['name'],
+                    lead_title=lead['title'],
+                    lead_company=lead['company'],
+                    persona_name=persona_name,
+                    message_number=2,
+                    previous_message=messages['follow_up_1'].get('variant_a'),
+                    aclient=aclient,
+                    models=models
+                )
+                logger.debug("✅ Done")
+            
+            # Save to database
+            if save_to_db:
+                logger.debug("💾 Saving messages to database...")
+                conn = await asyncio.shield(first_insert)
+                first_insert = None
+                last_rows = self._message_rows(lead_id, {'follow_up_2': messages['follow_up_2']}, models)
+                if conn is not None:
+                    await asyncio.to_thread(db_manager.commit_messages_bulk, conn, last_rows)
+                else:
+                    # The early insert failed; try the whole sequence in one go
+                    await asyncio.to_thread(self._save_messages_to_db, lead_id, messages, models)
+                logger.debug("✅ Saved")
+        finally:
+            if first_insert is not None:
+                # Generation failed or was cancelled: don't leave the transaction open
+                conn = await asyncio.shield(first_insert)
+                if conn is not None:
+                    await asyncio.to_thread(db_manager.rollback_messages_bulk, conn)
+        
+        logger.info("✅ Generated %d message variants for %s", len(messages) * 3, lead['name'])
+        
+        return messages
+    
+    def generate_message_sequence(self,
+                                  lead_id: int,
+                                  save_to_db: bool = True) -> Dict[str, Dict[str, str]]:
+        """
+        Generate the complete message sequence for a lead in a single API call
+        
+        One structured-output completion returns all three message types, so
+        the system prompt, the lead details and the round-trip are paid once
+        instead of three times. Falls back to generate_all_messages if the
+        call fails or the response can't be parsed.
+        
+        Args:
+            lead_id: Database ID of the lead
+            save_to_db: Whether to save messages to database
+            
+        Returns:
+            Dict with all message types and variants
+        """
+        
+        db_manager = _lazy_db()
+        if db_manager is None:
+            raise ValueError("Database access required for this function")
+        
+        lead = db_manager.get_lead_by_id(lead_id)
+        
+        if not lead:
+            raise ValueError(f"Lead {lead_id} not found")
         
-        # 1. Connection Request
-        print("\n  📝 Generating connection request...")
-        messages['connection_request'] = self.generate_connection_request(
+        logger.info("🎨 Generating message sequence for: %s (%s, %s)", lead['name'], lead['title'], lead['company'])
+        
+        persona_description = lead.get('persona_description')
+        user_message = self._build_connection_prompt(
             lead_name=lead['name'],
             lead_title=lead['title'],
             lead_company=lead['company'],
-            persona_name=persona_name,
+            persona_name=lead.get('persona_name'),
             persona_description=persona_description
-        )
-        print("     ✅ Done")
+        )[1]
         
-        # 2. First Follow-Up
-        print("  📝 Generating first follow-up...")
-        messages['follow_up_1'] = self.generate_follow_up_message(
-            lead_name=lead['name'],
-            lead_title=lead['title'],
-            lead_company=lead['company'],
-            persona_name=persona_name,
-            message_number=1
-        )
-        print("     ✅ Done")
+        model = self.route_model(persona_description)
+        try:
+            content = self._complete(
+                [_SYS_SEQUENCE, user_message],
+                SEQUENCE_MAX_TOKENS,
+                model=model,
+                n=1,
+                response_format=SEQUENCE_RESPONSE_FORMAT
+            )[0]
+            sequence = json.loads(content)
+            messages = {
+                message_type: self._finalize_variants(
+                    [sequence[message_type][key] for key in VARIANT_KEYS],
+                    CONNECTION_MAX_CHARS if message_type == 'connection_request' else FOLLOW_UP_MAX_CHARS
+                )
+                for message_type in SEQUENCE_MESSAGE_TYPES
+            }
+        except (TypeError, KeyError, ValueError) as e:
+            logger.warning("⚠️ Unusable sequence response (%s), generating messages separately", e)
+            return self.generate_all_messages(lead_id, save_to_db=save_to_db)
+        except Exception as e:
+            # Out of retries (rate limit, connection, API error): each message
+            # type then gets its own request, or its fallback copy
+            logger.error("❌ Error generating message sequence: %s", e)
+            return self.generate_all_messages(lead_id, save_to_db=save_to_db)
         
-        # 3. Second Follow-Up
-        print("  📝 Generating second follow-up...")
-        messages['follow_up_2'] = self.generate_follow_up_message(
-            lead_name=lead['name'],
-            lead_title=lead['title'],
-            lead_company=lead['company'],
-            persona_name=persona_name,
-            message_number=2,
-            previous_message=messages['follow_up_1']['variant_a']
-        )
-        print("     ✅ Done")
+        if save_to_db:
+            logger.debug("💾 Saving messages to database...")
+            self._save_messages_to_db(lead_id, messages, dict.fromkeys(messages, model))
+            logger.debug("✅ Saved")
+        
+        return messages
+    
+    async def generate_messages_bulk(self,
+                                     lead_ids: List[int],
+                                     rpm: int = None,
+                                     tpm: int = None,
+                                     max_parallel: int = 10,
+                                     save_to_db: bool = True,
+                                     on_lead_done: Callable[[int], None] = None) -> Dict[int, Dict[str, Dict[str, str]]]:
+        """
+        Generate complete message sequences for many leads in parallel
+        
+        Every (lead, message type) pair is queued as its own request and served
+        by `max_parallel` workers that share a requests/tokens-per-minute budget.
+        A lead's second follow-up is queued once its first follow-up is done.
+        
+        Args:
+            lead_ids: Database IDs of the leads
+            rpm: Requests per minute (defaults to the warm-up probe value, else 500)
+            tpm: Tokens per minute (defaults to the warm-up probe value, else 30000)
+            max_parallel: Maximum number of requests in flight
+            save_to_db: Whether to save messages to database
+            on_lead_done: Called with the lead ID once all of its messages are
+                generated (e.g. to advance a progress bar)
+            
+        Returns:
+            Dict mapping lead ID to its message types and variants. Leads
+            whose processing raised are logged, left out and not saved.
+        """
+        
+        db_manager = _lazy_db()
+        if db_manager is None:
+            raise ValueError("Database access required for this function")
+        
+        rpm = rpm or _RATE_LIMITS.get('requests_per_minute', 500)
+        tpm = tpm or _RATE_LIMITS.get('tokens_per_minute', 30000)
+        limiter = _RateLimiter(rpm, tpm)
+        
+        leads = db_manager.get_leads_by_ids(lead_ids)
+        for lead_id in lead_ids:
+            if lead_id not in leads:
+                logger.warning("⚠️ Lead %s not found, skipping", lead_id)
+        
+        logger.info("🎨 Generating messages for %d leads (max %d parallel, %d RPM, %d TPM)",
+                    len(leads), max_parallel, rpm, tpm)
+        
+        results = {lead_id: {} for lead_id in leads}
+        models = {lead_id: {} for lead_id in leads}
+        failed = set()
+        queue = asyncio.Queue()
+        for lead_id in leads:
+            queue.put_nowait((lead_id, 'connection_request'))
+            queue.put_nowait((lead_id, 'follow_up_1'))
+        
+        async def worker(aclient):
+            while True:
+                lead_id, message_type = await queue.get()
+                try:
+                    if lead_id in failed:
+                        continue
+                    
+                    variants, generated_by = await self._abulk_request(aclient, leads[lead_id], message_type,
+                                                                       results[lead_id], limiter)
+                    results[lead_id][message_type] = variants
+                    models[lead_id][message_type] = generated_by
+                    
+                    if message_type == 'follow_up_1':
+                        queue.put_nowait((lead_id, 'follow_up_2'))
+                    elif on_lead_done and len(results[lead_id]) == 3:
+                        on_lead_done(lead_id)
+                except Exception as e:
+                    # Keep the worker alive; an unfinished item would leave queue.join() waiting forever
+                    logger.error("❌ Error processing %s for lead %s: %s", message_type, lead_id, e)
+                    failed.add(lead_id)
+                finally:
+                    queue.task_done()
+        
+        # One client for the run, closed before this event loop ends
+        async with _async_openai_client(self.api_key) as aclient:
+            workers = [asyncio.create_task(worker(aclient)) for _ in range(max_parallel)]
+            try:
+                await queue.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        
+        for lead_id in failed:
+            del results[lead_id]
+        if failed:
+            logger.warning("⚠️ %d leads failed and were not saved: %s", len(failed), sorted(failed))
         
-        # Save to database
         if save_to_db:
-            print("\n  💾 Saving messages to database...")
-            self._save_messages_to_db(lead_id, messages)
-            print("     ✅ Saved")
+            logger.debug("💾 Saving messages to database...")
+            db_manager.create_messages_bulk([
+                row
+                for lead_id, messages in results.items()
+                for row in self._message_rows(lead_id, messages, models[lead_id])
+            ])
         
-        print(f"\n✅ Generated {len(messages) * 3} message variants for {lead['name']}")
+        logger.info("✅ Generated %d message variants for %d leads",
+                    sum(len(m) for m in results.values()) * 3, len(results))
         
-        return messages
+        return results
     
-    def _parse_variants(self, content: str) -> Dict[str, str]:
-        """Parse GPT-4 response into variant dictionary"""
-        variants = {}
+    async def _abulk_request(self,
+                             aclient,
+                             lead: Dict,
+                             message_type: str,
+                             done: Dict[str, Dict[str, str]],
+                             limiter: _RateLimiter) -> Tuple[Dict[str, str], str]:
+        """Run one rate-limited request for the bulk processor; returns the variants and their generated_by"""
         
-        for variant_key in ['VARIANT_A:', 'VARIANT_B:', 'VARIANT_C:']:
-            if variant_key in content:
-                # Extract message between this variant and the next
-                start = content.find(variant_key) + len(variant_key)
-                
-                # Find the next variant or end of string
-                next_variants = [v for v in ['VARIANT_A:', 'VARIANT_B:', 'VARIANT_C:'] if v != variant_key]
-                end_positions = [content.find(v, start) for v in next_variants if content.find(v, start) != -1]
-                
-                if end_positions:
-                    end = min(end_positions)
-                else:
-                    end = len(content)
-                
-                message = content[start:end].strip()
-                
-                # Clean up the message
-                message = message.replace('\n\n', ' ').replace('\n', ' ')
-                message = ' '.join(message.split())  # Remove extra whitespace
-                
-                # Map to lowercase key
-                key = variant_key.lower().replace(':', '').replace('_', '_')
-                variants[key] = message
+        if message_type == 'connection_request':
+            cache_key = self._cache_key('connection_request', lead.get('persona_name'), lead['title'])
+            messages = self._build_connection_prompt(
+                lead['name'], lead['title'], lead['company'], lead.get('persona_name'), lead.get('persona_description')
+            )
+            max_tokens, max_chars = CONNECTION_MAX_TOKENS, CONNECTION_MAX_CHARS
+            model = self.route_model(lead.get('persona_description'))
+        else:
+            message_number = 1 if message_type == 'follow_up_1' else 2
+            cache_key = self._cache_key('follow_up', lead.get('persona_name'), lead['title'], message_number)
+            previous_message = done['follow_up_1'].get('variant_a') if message_number == 2 else None
+            messages = self._build_follow_up_prompt(
+                lead['name'], lead['title'], lead['company'], lead.get('persona_name'),
+                message_number, previous_message
+            )
+            max_tokens, max_chars = FOLLOW_UP_MAX_TOKENS, FOLLOW_UP_MAX_CHARS
+            model = self.model
+        
+        cached = self._cache_get(cache_key, lead['name'], lead['company'])
+        if cached:
+            return cached, GENERATED_BY_CACHE
+        
+        try:
+            contents = await self._acomplete(aclient, messages, max_tokens, limiter, model)
+            variants = self._finalize_variants(contents, max_chars)
+            self._cache_set(cache_key, variants, lead['name'], lead['company'], lead.get('persona_name'))
+            return variants, model
+        
+        except Exception as e:
+            logger.error("❌ Error generating %s for lead %s: %s", message_type, lead['id'], e)
+        
+        if message_type == 'connection_request':
+            return self._get_fallback_messages(lead['name'], lead['title'], lead['company']), GENERATED_BY_FALLBACK
+        return self._get_fallback_followup_messages(lead['name'], lead['title'], message_number), GENERATED_BY_FALLBACK
+    
+    async def agenerate_messages_stream(self,
+                                        lead_name: str,
+                                        lead_title: str,
+                                        lead_company: str,
+                                        persona_name: str = None,
+                                        persona_description: str = None) -> AsyncIterator[Tuple[str, str, str]]:
+        """
+        Generate the complete message sequence, yielding variants as they arrive
+        
+        The connection request and first follow-up run concurrently, each
+        streamed so its variants come out as they finish. The second follow-up
+        builds on the first one's variant A and starts as soon as it arrives.
+        
+        Args:
+            lead_name: Name of the lead
+            lead_title: Job title of the lead
+            lead_company: Company name
+            persona_name: Target persona name
+            persona_description: Additional persona context
+            
+        Yields:
+            (message_type, variant_key, content) tuples
+        """
         
-        return variants
+        queue = asyncio.Queue()
+        tasks = []
+        
+        async def produce(message_type: str, variants: AsyncIterator[Tuple[str, str]]):
+            try:
+                async for variant_key, content in variants:
+                    queue.put_nowait((message_type, variant_key, content))
+            finally:
+                # None marks this message type as finished
+                queue.put_nowait((message_type, None, None))
+        
+        # One client for the whole sequence, closed before this event loop ends
+        async with _async_openai_client(self.api_key) as aclient:
+            def start_second_follow_up(previous_message: Optional[str]):
+                tasks.append(asyncio.create_task(produce('follow_up_2', self.astream_follow_up_message(
+                    lead_name=lead_name,
+                    lead_title=lead_title,
+                    lead_company=lead_company,
+                    persona_name=persona_name,
+                    message_number=2,
+                    previous_message=previous_message,
+                    aclient=aclient
+                ))))
+            
+            tasks.append(asyncio.create_task(produce('connection_request', self.astream_connection_request(
+                lead_name=lead_name,
+                lead_title=lead_title,
+                lead_company=lead_company,
+                persona_name=persona_name,
+                persona_description=persona_description,
+                aclient=aclient
+            ))))
+            tasks.append(asyncio.create_task(produce('follow_up_1', self.astream_follow_up_message(
+                lead_name=lead_name,
+                lead_title=lead_title,
+                lead_company=lead_company,
+                persona_name=persona_name,
+                message_number=1,
+                aclient=aclient
+            ))))
+            
+            try:
+                finished = 0
+                while finished < len(tasks):
+                    message_type, variant_key, content = await queue.get()
+                    
+                    if variant_key is None:
+                        finished += 1
+                        if message_type == 'follow_up_1' and len(tasks) == 2:
+                            # Variant A never arrived - write the second follow-up without it
+                            start_second_follow_up(None)
+                        continue
+                    
+                    if message_type == 'follow_up_1' and variant_key == 'variant_a':
+                        start_second_follow_up(content)
+                    
+                    yield message_type, variant_key, content
+            finally:
+                # Consumer stopped early - don't leave generations running on a closed client
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def compare_models(self, lead_id: int, models: List[str] = None) -> Dict[str, Dict]:
+        """
+        Generate a connection request for one lead with several models side by side
+        
+        Nothing is saved or cached; results are printed and returned so the
+        default model can be checked against the larger one.
+        
+        Args:
+            lead_id: Database ID of the lead
+            models: Model names to compare (defaults to default and high-quality models)
+        
+        Returns:
+            Dict of model -> {'variants', 'seconds', 'avg_chars', 'score'}
+        """
+        db_manager = _lazy_db()
+        if db_manager is None:
+            raise ValueError("Database access required for this function")
+        
+        lead = db_manager.get_lead_by_id(lead_id)
+        if not lead:
+            raise ValueError(f"Lead {lead_id} not found")
+        
+        results = {}
+        for model in models or [DEFAULT_MODEL, HIGH_QUALITY_MODEL]:
+            generator = MessageGenerator(api_key=self.api_key, model=model)
+            
+            start = time.perf_counter()
+            variants = generator.generate_connection_request(
+                lead_name=lead['name'],
+                lead_title=lead['title'],
+                lead_company=lead['company'],
+                persona_name=lead.get('persona_name'),
+                persona_description=lead.get('persona_description')
+            )
+            seconds = time.perf_counter() - start
+            
+            lengths = [len(message) for message in variants.values()]
+            scores = [self._score_message(message, lead, CONNECTION_MAX_CHARS) for message in variants.values()]
+            results[model] = {
+                'variants': variants,
+                'seconds': round(seconds, 2),
+                'avg_chars': round(sum(lengths) / len(lengths)) if lengths else 0,
+                'score': round(sum(scores) / len(scores), 2) if scores else 0
+            }
+            logger.info("🔬 %s: %ss, %s chars avg, score %s", model,
+                        results[model]['seconds'], results[model]['avg_chars'], results[model]['score'])
+        
+        return results
+    
+    @staticmethod
+    def _score_message(message: str, lead: Dict, max_chars: int) -> float:
+        """Rough 0-1 quality heuristic: fits the limit, personalized, no leftover labels"""
+        checks = [
+            0 < len(message) <= max_chars,
+            bool(lead.get('name')) and lead['name'].split()[0] in message,
+            bool(lead.get('company')) and lead['company'].lower() in message.lower(),
+            not re.search(r'variant|\[|\]|\{|\}', message, re.IGNORECASE),
+            len(message) >= max_chars // 3
+        ]
+        return sum(checks) / len(checks)
     
     def _get_fallback_messages(self, lead_name: str, lead_title: str, lead_company: str) -> Dict[str, str]:
-        """Return fallback messages if GPT-4 fails"""
+        """Return fallback messages if the OpenAI call fails"""
         return {
-            'variant_a': f"Hi {lead_name}, I came across your profile and was impressed by your work at {lead_company}. I'd love to connect and exchange ideas about {lead_title} best practices.",
-            'variant_b': f"Hi {lead_name}, fellow professional here. Your experience at {lead_company} caught my attention. Would be great to connect!",
-            'variant_c': f"Hi {lead_name}, I noticed we both work in similar spaces. Your role as {lead_title} is interesting - let's connect!"
+            key: template.format(lead_name=lead_name, lead_title=lead_title, lead_company=lead_company)
+            for key, template in FALLBACK_CONNECTION_TEMPLATES
         }
     
     def _get_fallback_followup_messages(self, lead_name: str, lead_title: str, message_number: int) -> Dict[str, str]:
-        """Return fallback follow-up messages if GPT-4 fails"""
-        if message_number == 1:
-            return {
-                'variant_a': f"Hi {lead_name}, following up on my connection request. I think there could be some great synergies between what you're doing and what we offer. Would you be open to a quick chat?",
-                'variant_b': f"Hey {lead_name}, wanted to reach out again. I've been following your work and think we could help with some of the challenges in {lead_title}. Interested in learning more?",
-                'variant_c': f"{lead_name}, quick follow-up - we've helped several companies in your space improve their results. Would love to share some insights if you have 15 minutes this week?"
-            }
-        else:
-            return {
-                'variant_a': f"Hi {lead_name}, I know you're busy, but I wanted to make one more attempt to connect. We've seen great results helping companies like yours. Open to a brief call this week?",
-                'variant_b': f"{lead_name}, final follow-up from me. If the timing isn't right now, no worries - but I'd hate for you to miss out on what we could potentially achieve together. Let me know!",
-                'variant_c': f"Hi {lead_name}, last message from me! Just wanted to make sure you saw my previous notes. If you're interested in discussing how we can help, I'm here. Otherwise, I'll check back in a few months."
-            }
+        """Return fallback follow-up messages if the OpenAI call fails"""
+        templates = FALLBACK_FOLLOWUP_TEMPLATES[1 if message_number == 1 else 2]
+        return {
+            key: template.format(lead_name=lead_name, lead_title=lead_title)
+            for key, template in templates
+        }
     
-    def _save_messages_to_db(self, lead_id: int, messages: Dict[str, Dict[str, str]]):
+    def _save_messages_to_db(self,
+                             lead_id: int,
+                             messages: Dict[str, Dict[str, str]],
+                             models: Dict[str, str] = None):
         """Save generated messages to database"""
-        # This would integrate with your database manager
-        # Implementation depends on your database schema
-        pass
+        _lazy_db().create_messages_bulk(self._message_rows(lead_id, messages, models))
+    
+    def _message_rows(self,
+                      lead_id: int,
+                      messages: Dict[str, Dict[str, str]],
+                      models: Dict[str, str] = None) -> List[Dict]:
+        """
+        Flatten a lead's message types and variants into database rows
+        
+        `models` maps a message type to its generated_by value as recorded by
+        the generate methods (a model name, GENERATED_BY_CACHE or
+        GENERATED_BY_FALLBACK); types not in it were generated by the draft model.
+        """
+        models = models or {}
+        return [
+            {
+                'lead_id': lead_id,
+                'message_type': message_type,
+                'content': content,
+                'variant': variant_key.split('_')[-1].upper(),
+                'generated_by': models.get(message_type, self.model),
+                'prompt_used': f"Generated {message_type}"
+            }
+            for message_type, variants in messages.items()
+            for variant_key, content in variants.items()
+        ]
+
+
+@functools.lru_cache(maxsize=8)
+def _get_generator(api_key: Optional[str] = None) -> MessageGenerator:
+    """Shared generator per API key, so repeat calls reuse its HTTP connections"""
+    return MessageGenerator(api_key=api_key)
+
+
+async def collect(variants: AsyncIterator[Tuple[str, str]]) -> Dict[str, str]:
+    """Gather a streamed (variant_key, message) sequence into a variants dict"""
+    return {variant_key: message async for variant_key, message in variants}
 
 
 # Convenience functions for quick message generation
@@ -378,8 +1609,7 @@ def generate_connection_message(lead_name: str,
     Returns:
         Dict with 3 message variants (variant_a, variant_b, variant_c)
     """
-    generator = MessageGenerator(api_key=api_key)
-    return generator.generate_connection_request(
+    return _get_generator(api_key).generate_connection_request(
         lead_name=lead_name,
         lead_title=lead_title,
         lead_company=lead_company,
@@ -409,8 +1639,7 @@ def generate_followup_message(lead_name: str,
     Returns:
         Dict with 3 message variants (variant_a, variant_b, variant_c)
     """
-    generator = MessageGenerator(api_key=api_key)
-    return generator.generate_follow_up_message(
+    return _get_generator(api_key).generate_follow_up_message(
         lead_name=lead_name,
         lead_title=lead_title,
         lead_company=lead_company,
@@ -420,21 +1649,68 @@ def generate_followup_message(lead_name: str,
     )
 
 
+def _parse_lead_ids(lead_ids: str = None, leads_file: str = None) -> List[int]:
+    """Collect lead IDs from a comma-separated list and/or a file (commas or one per line)"""
+    raw = []
+    if lead_ids:
+        raw.extend(lead_ids.split(','))
+    if leads_file:
+        raw.extend(Path(leads_file).read_text().replace(',', '\n').splitlines())
+    return [int(value) for value in (item.strip() for item in raw) if value]
+
+
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Generate LinkedIn messages')
+    parser.add_argument('--lead-ids', type=str, help='Comma-separated lead IDs, e.g. 1,2,3')
+    parser.add_argument('--leads-file', type=str, help='File of lead IDs (one per line or comma-separated)')
+    parser.add_argument('--rpm', type=int, help='Requests per minute budget')
+    parser.add_argument('--tpm', type=int, help='Tokens per minute budget')
+    parser.add_argument('--max-parallel', type=int, default=10, help='Maximum requests in flight')
+    parser.add_argument('--no-save', action='store_true', help="Don't save messages to the database")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    
+    ids = _parse_lead_ids(args.lead_ids, args.leads_file)
+    if ids:
+        # One process, one client and one rate-limit budget for the whole cohort
+        try:
+            from tqdm import tqdm
+            progress = tqdm(total=len(ids), unit='lead')
+        except ImportError:
+            progress = None
+        
+        generator = MessageGenerator()
+        asyncio.run(generator.generate_messages_bulk(
+            ids,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            max_parallel=args.max_parallel,
+            save_to_db=not args.no_save,
+            on_lead_done=(lambda lead_id: progress.update()) if progress else None
+        ))
+        if progress:
+            progress.close()
+        sys.exit(0)
+    
     # Test the message generator
     print("\n" + "="*60)
     print("🧪 MESSAGE GENERATOR TEST")
     print("="*60)
     
-    test_messages = generate_connection_message(
-        lead_name="John Smith",
-        lead_title="VP of Marketing",
-        lead_company="Tech Corp",
-        persona_name="Marketing Leaders"
-    )
+    async def run_test():
+        generator = MessageGenerator()
+        async for message_type, variant, message in generator.agenerate_messages_stream(
+            lead_name="John Smith",
+            lead_title="VP of Marketing",
+            lead_company="Tech Corp",
+            persona_name="Marketing Leaders"
+        ):
+            print(f"\n{message_type} - {variant.upper()}:")
+            print(f"  {message}")
+            print(f"  Length: {len(message)} characters")
     
     print("\n✅ Generated Messages:")
-    for variant, message in test_messages.items():
-        print(f"\n{variant.upper()}:")
-        print(f"  {message}")
-        print(f"  Length: {len(message)} characters")
\ No newline at end of file
+    asyncio.run(run_test())
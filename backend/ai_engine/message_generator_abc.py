@@ -4,27 +4,218 @@ SC AI Lead Generation System - A/B/C Message Generator
 🎨 NEW: AI-Enhanced Template Integration
 """
 
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import re
 import sys
+import time
+import weakref
 from pathlib import Path
-from typing import Dict, List, Optional
-from openai import OpenAI
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from openai import APIConnectionError, APITimeoutError, InternalServerError, OpenAI, RateLimitError
+from openai.types.chat import ChatCompletion
 
-sys.path.append(str(Path(__file__).parent.parent))
+if __name__ == "__main__":
+    # Run as a script: make the `backend` package importable
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
 
 from backend.database.db_manager import db_manager
 from backend.credentials_manager import credentials_manager
+from backend.ai_engine.message_cache import (NAME_PLACEHOLDER, PromptResponseCache, StructuralMessageCache,
+                                             message_cache, normalize_title)
+from backend.ai_engine.message_generator import (DEFAULT_MODEL, GENERATED_BY_CACHE, GENERATED_BY_FALLBACK,
+                                                 MAX_ATTEMPTS, VARIANTS_RESPONSE_FORMAT, MessageGenerator,
+                                                 _RATE_LIMITS, _RateLimiter, _async_openai_client, _backoff_delay,
+                                                 _estimate_request_tokens, _run_sync, _shared_http_client)
+
+
+logger = logging.getLogger(__name__)
+
+# API errors worth retrying: rate limits, timeouts, dropped connections, 5xx
+TRANSIENT_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+# Generated rows are written in one transaction per this many messages
+SAVE_BATCH_SIZE = 50
+
+# Results dict of the batch the current task belongs to, so retries are
+# counted per run even though generators are shared between runs
+_batch_results: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar('abc_batch_results', default=None)
+
+# Connection request length and the completion budget for three of them:
+# 200 // 3 = 66 tokens each at ~3 chars per token, plus 40 for the JSON
+# around them, i.e. 238 tokens
+VARIANT_MAX_CHARS = 200
+VARIANTS_MAX_TOKENS = 3 * (VARIANT_MAX_CHARS // 3) + 40
+
+# Batch API polling: start at 10s between checks, back off to at most 5 minutes
+BATCH_POLL_SECONDS = 10
+BATCH_MAX_POLL_SECONDS = 300
+BATCH_FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# A variant field whose closing quote has arrived in a streamed JSON response
+_STREAMED_VARIANT_RE = re.compile(r'"(variant_[abc])"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+# Fallback copy used when the OpenAI call fails, as (variant_key, template) pairs
+FALLBACK_VARIANT_TEMPLATES = (
+    ('variant_a', "Hey {first_name}, fellow {title} here - would love to connect and swap notes"),
+    ('variant_b', "Hi {first_name}, I help {title}s with lead gen. Worth a quick chat?"),
+    ('variant_c', "{first_name}, respect what you're building at {company}. Let's connect?"),
+)
+
+# Field values scraped leads use for "missing"; a lead with at most one real
+# field among name, title and company gets the fallback copy without a call
+_EMPTY_FIELD_VALUES = {'', 'n/a', 'na', 'none', 'null', 'unknown', '-'}
+MIN_LEAD_FIELDS = 2
+
+# Template placeholders copied verbatim from a lead field (readdressing only swaps the first name)
+TEMPLATE_LEAD_FIELDS = {
+    'full_name': 'name',
+    'title': 'title',
+    'company': 'company',
+    'industry': 'industry',
+    'location': 'location'
+}
+
+# Sent once when the model overshoots the limit, instead of cutting variants off
+SHORTEN_INSTRUCTION = f"Rewrite each variant to be strictly under {VARIANT_MAX_CHARS - 20} characters. Return the same JSON."
+
+# Static instructions live in the system message and the lead comes last, so
+# every request of a kind starts with the same bytes and the API's automatic
+# prompt caching can reuse the prefix.
+TEMPLATE_SYSTEM_PROMPT = """You personalize LinkedIn connection request templates naturally, keeping the user's voice while adding relevant details about each lead.
+
+The user sends the original template and the lead's profile. Create 3 DIFFERENT personalized versions (A, B, C) of the template. Each variant should:
+1. Keep the core message and tone from the template
+2. Add specific personalization based on the lead's profile
+3. Stay under 200 characters (LinkedIn limit)
+4. Sound natural and human, not robotic
+5. Be genuinely different from each other
+
+**variant_a - Keep closest to original template:**
+Enhance the template slightly with lead-specific details.
+
+**variant_b - More casual/conversational:**
+Rewrite in a more relaxed, friendly tone while keeping the core message.
+
+**variant_c - More direct/confident:**
+Rewrite with a more assertive, confident approach while keeping the core message.
+
+**CRITICAL RULES:**
+- Under 200 characters each
+- NO corporate buzzwords: "solutions", "synergy", "leverage"
+- NO AI phrases: "I noticed", "I came across"
+- Sound like a real human texting
+- NO emojis
+- Keep the core intent of the original template
+
+Return JSON with variant_a, variant_b and variant_c."""
+
+# Shared by single-lead and multi-lead generation
+_GENERATE_INTRO = "You write natural, human-sounding LinkedIn connection requests. No corporate speak. Be brief and casual like texting a friend - NOT like AI or a salesperson."
+
+_GENERATE_RULES = """**CRITICAL RULES:**
+1. Under 200 characters (LinkedIn connection request limit)
+2. Sound like a REAL person texting a colleague
+3. NO corporate buzzwords: "solutions", "value", "partnership", "synergy", "leverage"
+4. NO AI phrases: "I noticed", "I came across", "I saw", "reaching out"
+5. Be casual, direct, and friendly
+6. Get to the point quickly
+7. NO emojis
+8. NO long introductions
+
+**BAD Examples (DON'T write like this):**
+❌ "Dear {first_name}, As the {title} of {company}, you're surely on the lookout for..."
+❌ "Hi {first_name}, I noticed your impressive work at {company}. I'd love to discuss how our solutions..."
+❌ "Hi {first_name}, I came across your profile and thought we could create synergy..."
+
+**GOOD Examples (Write like THIS):**
+✅ "Hey {first_name}, fellow {title} here - would love to connect and swap notes"
+✅ "Hi {first_name}, I help {title}s with [specific problem]. Worth a quick chat?"
+✅ "{first_name}, respect what you're building at {company}. Let's connect?"
+✅ "Hey {first_name}, working on something for {title}s. Can I pick your brain?"
+
+**Generate 3 DIFFERENT casual messages:**
+- variant_a - Direct approach (like a quick intro at a conference)
+- variant_b - Question-based (like asking for advice)
+- variant_c - Compliment-based (like genuine respect)"""
+
+GENERATE_SYSTEM_PROMPT = f"""{_GENERATE_INTRO}
+
+The user sends the lead's info. {_GENERATE_RULES}
+
+Return JSON with variant_a, variant_b and variant_c."""
+
+MULTI_LEAD_SYSTEM_PROMPT = f"""{_GENERATE_INTRO}
+
+The user sends several leads, each headed by its lead ID. {_GENERATE_RULES}
+
+Return JSON with a "leads" list holding lead_id, variant_a, variant_b and variant_c for every lead."""
+
+_SYS_TEMPLATE = {"role": "system", "content": TEMPLATE_SYSTEM_PROMPT}
+_SYS_GENERATE = {"role": "system", "content": GENERATE_SYSTEM_PROMPT}
+_SYS_MULTI_LEAD = {"role": "system", "content": MULTI_LEAD_SYSTEM_PROMPT}
+
+# Structured output for several leads in one response
+MULTI_LEAD_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "lead_variants",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "leads": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "lead_id": {"type": "integer"},
+                            "variant_a": {"type": "string"},
+                            "variant_b": {"type": "string"},
+                            "variant_c": {"type": "string"}
+                        },
+                        "required": ["lead_id", "variant_a", "variant_b", "variant_c"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["leads"],
+            "additionalProperties": False
+        }
+    }
+}
 
 
 class ABCMessageGenerator:
     """Generate A/B/C message variants for leads with optional template integration"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, max_concurrent: int = 5, model: str = None, use_cache: bool = False):
+        """
+        Args:
+            api_key: OpenAI API key (defaults to the stored credentials)
+            max_concurrent: Maximum API calls in flight during a batch
+            model: Chat model (defaults to Config.MESSAGE_MODEL)
+            use_cache: Reuse variants generated for leads with the same persona
+                and title family, with name and company swapped in (see
+                message_cache). Applies to generation without a template.
+        """
         self.api_key = api_key or credentials_manager.get_openai_key()
         if not self.api_key:
             raise ValueError("OpenAI API key required")
         
-        self.client = OpenAI(api_key=self.api_key)
-        self.model = "gpt-4"
+        self.client = OpenAI(api_key=self.api_key, max_retries=0, http_client=_shared_http_client())
+        self.model = model or DEFAULT_MODEL
+        self.max_concurrent = max_concurrent
+        self.cache = message_cache if use_cache else None
+        
+        # Requests currently being sent, keyed by request hash, so identical
+        # prompts in one batch share a single API call. Kept per async client:
+        # a client (and the task using it) belongs to one event loop, and a
+        # shared call must not outlive the client it is sent through
+        self._in_flight: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
     
     def _fill_template_placeholders(self, template: str, lead: Dict) -> str:
         """Replace template placeholders with actual lead data"""
@@ -46,6 +237,151 @@ class ABCMessageGenerator:
         
         return filled
     
+    def _build_template_request(self, lead: Dict, filled_template: str) -> Dict:
+        """Chat completion arguments for personalizing a filled-in template"""
+        
+        first_name = lead.get('name', '').split()[0] if lead.get('name') else 'there'
+        
+        prompt = f"""Original Template:
+{filled_template}
+
+Lead Profile:
+- Name: {lead.get('name', 'Professional')}
+- First Name: {first_name}
+- Title: {lead.get('title', 'Professional')}
+- Company: {lead.get('company', 'your company')}
+- Headline: {lead.get('headline', 'N/A')}"""
+        
+        return {
+            'model': self.model,
+            'messages': [
+                _SYS_TEMPLATE,
+                {"role": "user", "content": prompt}
+            ],
+            'temperature': 0.8,
+            'max_tokens': VARIANTS_MAX_TOKENS,
+            'response_format': VARIANTS_RESPONSE_FORMAT
+        }
+    
+    def _build_request(self, lead: Dict) -> Dict:
+        """Chat completion arguments for generating variants from scratch"""
+        
+        return {
+            'model': self.model,
+            'messages': [
+                _SYS_GENERATE,
+                {"role": "user", "content": f"Lead Info:\n{self._lead_info(lead)}"}
+            ],
+            'temperature': 0.9,
+            'max_tokens': VARIANTS_MAX_TOKENS,
+            'response_format': VARIANTS_RESPONSE_FORMAT
+        }
+    
+    def _build_multi_lead_request(self, leads: List[Dict]) -> Dict:
+        """Chat completion arguments for generating variants for several leads at once"""
+        
+        prompt = "\n\n".join(f"Lead {lead['id']}:\n{self._lead_info(lead)}" for lead in leads)
+        
+        return {
+            'model': self.model,
+            'messages': [
+                _SYS_MULTI_LEAD,
+                {"role": "user", "content": prompt}
+            ],
+            'temperature': 0.9,
+            'max_tokens': VARIANTS_MAX_TOKENS * len(leads),
+            'response_format': MULTI_LEAD_RESPONSE_FORMAT
+        }
+    
+    @staticmethod
+    def _is_sparse(lead: Dict) -> bool:
+        """True when the lead has too little information for a personalized message"""
+        filled = sum(
+            ABCMessageGenerator._field(lead, field) is not None
+            for field in ('name', 'title', 'company')
+        )
+        return filled < MIN_LEAD_FIELDS
+    
+    @staticmethod
+    def _field(lead: Dict, field: str, default: Optional[str] = None) -> Optional[str]:
+        """A lead field, or `default` when it is missing or a placeholder like 'N/A'"""
+        value = str(lead.get(field) or '').strip()
+        return default if value.lower() in _EMPTY_FIELD_VALUES else value
+    
+    @staticmethod
+    def _lead_info(lead: Dict) -> str:
+        """The lead's details as prompt lines"""
+        first_name = lead.get('name', '').split()[0] if lead.get('name') else 'there'
+        return f"""- Name: {lead.get('name', 'Professional')}
+- First Name: {first_name}
+- Title: {lead.get('title', 'Professional')}
+- Company: {lead.get('company', 'your company')}"""
+    
+    @staticmethod
+    def _record_model(models: Optional[Dict[int, str]], lead: Dict, generated_by: str):
+        """Note where a lead's variants came from, for generated_by"""
+        if models is not None:
+            models[lead.get('id')] = generated_by
+    
+    def _template_variants_from_response(self,
+                                         response,
+                                         filled_template: str,
+                                         lead: Dict,
+                                         models: Dict[int, str] = None) -> Dict[str, str]:
+        """Parse a template-personalization response, falling back to the template itself"""
+        
+        content = response.choices[0].message.content.strip()
+        variants = self._parse_variants(content)
+        
+        # Validate
+        if not all(k in variants for k in ['variant_a', 'variant_b', 'variant_c']):
+            logger.warning("⚠️ Template generation incomplete, using fallback")
+            self._record_model(models, lead, GENERATED_BY_FALLBACK)
+            return self._get_template_fallback_variants(filled_template, lead)
+        
+        first_name = lead.get('name', '').split()[0] if lead.get('name') else 'there'
+        logger.debug("✅ Generated template-based variants for %s", first_name)
+        self._record_model(models, lead, self.model)
+        return variants
+    
+    def _variants_from_response(self, response, lead: Dict, models: Dict[int, str] = None) -> Dict[str, str]:
+        """Parse a generation response, falling back if any variant is missing"""
+        
+        content = response.choices[0].message.content.strip()
+        variants = self._parse_variants(content)
+        
+        # Validate all variants exist
+        required_keys = ['variant_a', 'variant_b', 'variant_c']
+        for key in required_keys:
+            if key not in variants or not variants[key]:
+                logger.warning("⚠️ Missing %s, using fallback", key)
+                self._record_model(models, lead, GENERATED_BY_FALLBACK)
+                return self._get_fallback_variants(lead)
+        
+        self._cache_set(lead, variants)
+        self._record_model(models, lead, self.model)
+        return variants
+    
+    def _cache_key(self, lead: Dict) -> Optional[str]:
+        """Structural cache key for a lead, or None when caching is off"""
+        if self.cache is None:
+            return None
+        return self.cache.make_key('abc_connection_request', lead.get('persona_name'), lead.get('title'))
+    
+    def _cache_get(self, lead: Dict) -> Optional[Dict[str, str]]:
+        """Cached variants filled in for this lead, if a complete set exists"""
+        cache_key = self._cache_key(lead)
+        if cache_key is None:
+            return None
+        variants = self.cache.get(cache_key, lead.get('name', ''), lead.get('company', ''))
+        return variants if variants and len(variants) == 3 else None
+    
+    def _cache_set(self, lead: Dict, variants: Dict[str, str]):
+        """Store freshly generated variants as templates for similar leads"""
+        cache_key = self._cache_key(lead)
+        if cache_key is not None:
+            self.cache.set(cache_key, variants, lead.get('name', ''), lead.get('company', ''), lead.get('persona_name'))
+    
     def generate_variants_with_template(self, lead: Dict, template_id: int) -> Dict[str, str]:
         """
         Generate A/B/C variants based on a user's template
@@ -63,91 +399,18 @@ class ABCMessageGenerator:
         template_data = db_manager.get_message_template(template_id)
         
         if not template_data:
-            print(f"⚠️ Template {template_id} not found, using default generation")
+            logger.warning("⚠️ Template %s not found, using default generation", template_id)
             return self.generate_variants(lead)
         
-        template_text = template_data['template']
-        
         # Fill in basic placeholders
-        filled_template = self._fill_template_placeholders(template_text, lead)
-        
-        first_name = lead.get('name', '').split()[0] if lead.get('name') else 'there'
-        title = lead.get('title', 'Professional')
-        company = lead.get('company', 'your company')
-        
-        prompt = f"""You are personalizing a LinkedIn connection request template for a specific lead.
-
-**Original Template:**
-{filled_template}
-
-**Lead Profile:**
-- Name: {lead.get('name', 'Professional')}
-- First Name: {first_name}
-- Title: {title}
-- Company: {company}
-- Headline: {lead.get('headline', 'N/A')}
-
-**Your Task:**
-Create 3 DIFFERENT personalized versions (A, B, C) of this template. Each variant should:
-1. Keep the core message and tone from the template
-2. Add specific personalization based on the lead's profile
-3. Stay under 200 characters (LinkedIn limit)
-4. Sound natural and human, not robotic
-5. Be genuinely different from each other
-
-**VARIANT A - Keep closest to original template:**
-Enhance the template slightly with lead-specific details.
-
-**VARIANT B - More casual/conversational:**
-Rewrite in a more relaxed, friendly tone while keeping the core message.
-
-**VARIANT C - More direct/confident:**
-Rewrite with a more assertive, confident approach while keeping the core message.
-
-**CRITICAL RULES:**
-- Under 200 characters each
-- NO corporate buzzwords: "solutions", "synergy", "leverage"
-- NO AI phrases: "I noticed", "I came across"
-- Sound like a real human texting
-- NO emojis
-- Keep the core intent of the original template
-
-Generate the 3 variants now:
-
-VARIANT A:
-
-
-VARIANT B:
-
-
-VARIANT C:
-
-"""
+        filled_template = self._fill_template_placeholders(template_data['template'], lead)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You personalize message templates naturally, keeping the user's voice while adding relevant details about each lead."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.8,
-                max_tokens=400
-            )
-            
-            content = response.choices[0].message.content.strip()
-            variants = self._parse_variants(content)
-            
-            # Validate
-            if not all(k in variants for k in ['variant_a', 'variant_b', 'variant_c']):
-                print(f"⚠️ Template generation incomplete, using fallback")
-                return self._get_template_fallback_variants(filled_template, lead)
-            
-            print(f"✅ Generated template-based variants for {first_name}")
-            return variants
+            response = self._complete(self._build_template_request(lead, filled_template))
+            return self._template_variants_from_response(response, filled_template, lead)
             
         except Exception as e:
-            print(f"❌ Error generating template variants: {str(e)}")
+            self._log_generation_error("template variants", e)
             return self._get_template_fallback_variants(filled_template, lead)
     
     def generate_variants(self, lead: Dict, template_id: Optional[int] = None) -> Dict[str, str]:
@@ -166,149 +429,314 @@ VARIANT C:
         if template_id:
             return self.generate_variants_with_template(lead, template_id)
         
-        # Otherwise use original AI generation
-        first_name = lead.get('name', '').split()[0] if lead.get('name') else 'there'
-        title = lead.get('title', 'Professional')
-        company = lead.get('company', 'your company')
+        if self._is_sparse(lead):
+            return self._get_fallback_variants(lead)
         
-        prompt = f"""You are writing LinkedIn connection requests. Write naturally like a real human, NOT like AI or a salesperson.
-
-**Lead Info:**
-- Name: {lead.get('name', 'Professional')}
-- First Name: {first_name}
-- Title: {title}
-- Company: {company}
-
-**CRITICAL RULES:**
-1. Under 200 characters (LinkedIn connection request limit)
-2. Sound like a REAL person texting a colleague
-3. NO corporate buzzwords: "solutions", "value", "partnership", "synergy", "leverage"
-4. NO AI phrases: "I noticed", "I came across", "I saw", "reaching out"
-5. Be casual, direct, and friendly
-6. Get to the point quickly
-7. NO emojis
-8. NO long introductions
-
-**BAD Examples (DON'T write like this):**
-❌ "Dear {first_name}, As the {title} of {company}, you're surely on the lookout for..."
-❌ "Hi {first_name}, I noticed your impressive work at {company}. I'd love to discuss how our solutions..."
-❌ "Hi {first_name}, I came across your profile and thought we could create synergy..."
-
-**GOOD Examples (Write like THIS):**
-✅ "Hey {first_name}, fellow {title} here - would love to connect and swap notes"
-✅ "Hi {first_name}, I help {title}s with [specific problem]. Worth a quick chat?"
-✅ "{first_name}, respect what you're building at {company}. Let's connect?"
-✅ "Hey {first_name}, working on something for {title}s. Can I pick your brain?"
-
-**Generate 3 DIFFERENT casual messages:**
-
-VARIANT A - Direct approach (like a quick intro at a conference):
-
-
-VARIANT B - Question-based (like asking for advice):
-
-
-VARIANT C - Compliment-based (like genuine respect):
-
-"""
+        cached = self._cache_get(lead)
+        if cached:
+            return cached
         
+        # Otherwise use original AI generation
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You write natural, human-sounding LinkedIn messages. No corporate speak. Be brief and casual like texting a friend."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.9,
-                max_tokens=300
-            )
+            response = self._complete(self._build_request(lead))
+            return self._variants_from_response(response, lead)
             
-            content = response.choices[0].message.content.strip()
-            variants = self._parse_variants(content)
+        except Exception as e:
+            self._log_generation_error("variants", e)
+            return self._get_fallback_variants(lead)
+    
+    async def agenerate_variants(self,
+                                 lead: Dict,
+                                 template_text: Optional[str] = None,
+                                 semaphore: asyncio.Semaphore = None,
+                                 limiter: _RateLimiter = None,
+                                 aclient=None,
+                                 models: Dict[int, str] = None) -> Dict[str, str]:
+        """
+        Async version of generate_variants
+        
+        Args:
+            lead: Dict with lead information (name, title, company, persona)
+            template_text: Optional template to personalize (already loaded)
+            semaphore: Caps how many API calls run at once across a batch
+            limiter: Shared RPM/TPM budget every API call waits on
+            aclient: AsyncOpenAI client of the current run (opened for this
+                call if not given)
+            models: Filled in with what produced the variants (the model,
+                'cache' or 'fallback'), keyed by lead ID
             
-            # Validate all variants exist
-            required_keys = ['variant_a', 'variant_b', 'variant_c']
-            for key in required_keys:
-                if key not in variants or not variants[key]:
-                    print(f"⚠️ Missing {key}, using fallback")
-                    variants = self._get_fallback_variants(lead)
-                    break
+        Returns:
+            Dict with keys: variant_a, variant_b, variant_c
+        """
+        
+        filled_template = self._fill_template_placeholders(template_text, lead) if template_text else None
+        
+        if not filled_template:
+            if self._is_sparse(lead):
+                self._record_model(models, lead, GENERATED_BY_FALLBACK)
+                return self._get_fallback_variants(lead)
+            cached = self._cache_get(lead)
+            if cached:
+                self._record_model(models, lead, GENERATED_BY_CACHE)
+                return cached
+        
+        if filled_template:
+            request = self._build_template_request(lead, filled_template)
+        else:
+            request = self._build_request(lead)
+        
+        try:
+            async with _async_openai_client(self.api_key, aclient) as aclient:
+                response = await self._acomplete(aclient, request, semaphore, limiter)
             
-            return variants
+            if filled_template:
+                return self._template_variants_from_response(response, filled_template, lead, models)
+            return self._variants_from_response(response, lead, models)
             
         except Exception as e:
-            print(f"❌ Error generating variants: {str(e)}")
+            self._log_generation_error("variants", e)
+            self._record_model(models, lead, GENERATED_BY_FALLBACK)
+            if filled_template:
+                return self._get_template_fallback_variants(filled_template, lead)
             return self._get_fallback_variants(lead)
     
-    def _parse_variants(self, content: str) -> Dict[str, str]:
-        """Parse GPT-4 response into variant dictionary"""
+    async def astream_variants(self, lead: Dict, aclient=None) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Streaming version of generate_variants
         
-        variants = {}
-        lines = content.split('\n')
-        current_variant = None
-        current_message = []
+        Each variant is yielded as soon as its JSON field closes in the
+        stream, so a caller can show variant A while B and C are still being
+        written. Over-long variants are trimmed rather than rewritten.
         
-        for line in lines:
-            line = line.strip()
-            
-            if line.startswith('VARIANT A'):
-                if current_variant and current_message:
-                    variants[current_variant] = ' '.join(current_message).strip()
-                current_variant = 'variant_a'
-                current_message = []
-                if ':' in line:
-                    message_part = line.split(':', 1)[1].strip()
-                    if message_part:
-                        current_message.append(message_part)
-            
-            elif line.startswith('VARIANT B'):
-                if current_variant and current_message:
-                    variants[current_variant] = ' '.join(current_message).strip()
-                current_variant = 'variant_b'
-                current_message = []
-                if ':' in line:
-                    message_part = line.split(':', 1)[1].strip()
-                    if message_part:
-                        current_message.append(message_part)
+        Args:
+            lead: Dict with lead information (name, title, company, persona)
+            aclient: AsyncOpenAI client of the current run (opened for this
+                stream if not given)
             
-            elif line.startswith('VARIANT C'):
-                if current_variant and current_message:
-                    variants[current_variant] = ' '.join(current_message).strip()
-                current_variant = 'variant_c'
-                current_message = []
-                if ':' in line:
-                    message_part = line.split(':', 1)[1].strip()
-                    if message_part:
-                        current_message.append(message_part)
+        Yields:
+            (variant_key, message) tuples
+        """
+        
+        cached = self._get_fallback_variants(lead) if self._is_sparse(lead) else self._cache_get(lead)
+        if cached:
+            for item in cached.items():
+                yield item
+            return
+        
+        variants = {}
+        try:
+            async with _async_openai_client(self.api_key, aclient) as aclient:
+                stream = await self._acreate(aclient, {**self._build_request(lead), 'stream': True})
+                content = ''
+                scanned = 0
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    content += chunk.choices[0].delta.content or ''
+                    for match in _STREAMED_VARIANT_RE.finditer(content, scanned):
+                        scanned = match.end()
+                        variant = self._clean_variants({match.group(1): json.loads(match.group(2))})
+                        for variant_key, message in variant.items():
+                            if variant_key not in variants:
+                                variants[variant_key] = message
+                                yield variant_key, message
+        except Exception as e:
+            self._log_generation_error("streamed variants", e)
+        
+        if len(variants) < 3:
+            for variant_key, message in self._get_fallback_variants(lead).items():
+                if variant_key not in variants:
+                    yield variant_key, message
+            return
+        
+        self._cache_set(lead, variants)
+    
+    def _shorten_request(self, request: Dict, response) -> Optional[Dict]:
+        """Follow-up request asking for shorter variants, or None when every variant fits"""
+        
+        content = response.choices[0].message.content or ''
+        variants = self._parse_variants(content, trim=False)
+        if all(len(message) <= VARIANT_MAX_CHARS for message in variants.values()):
+            return None
+        
+        logger.debug("✂️ Variants over %d characters, asking for a shorter rewrite", VARIANT_MAX_CHARS)
+        return {
+            **request,
+            'messages': request['messages'] + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": SHORTEN_INSTRUCTION}
+            ]
+        }
+    
+    def _complete(self, request: Dict):
+        """Run a generation request, with one shorter rewrite if any variant is over the limit"""
+        response = self._create(request)
+        retry = self._shorten_request(request, response)
+        return self._create(retry) if retry else response
+    
+    async def _acomplete(self, aclient, request: Dict, semaphore: asyncio.Semaphore = None, limiter: _RateLimiter = None):
+        """Async version of _complete, sent through `aclient`; identical requests already in flight share one call"""
+        key = PromptResponseCache.make_key(request)
+        in_flight = self._in_flight.setdefault(aclient, {})
+        task = in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._acomplete_once(aclient, request, semaphore, limiter))
+            in_flight[key] = task
+            task.add_done_callback(lambda _: in_flight.pop(key, None))
+        # A caller that is cancelled stops waiting without cancelling the call for the others
+        return await asyncio.shield(task)
+    
+    async def _acomplete_once(self, aclient, request: Dict, semaphore: asyncio.Semaphore = None, limiter: _RateLimiter = None):
+        """Send one generation request, with one shorter rewrite if any variant is over the limit"""
+        response = await self._acreate(aclient, request, semaphore, limiter)
+        retry = self._shorten_request(request, response)
+        return await self._acreate(aclient, retry, semaphore, limiter) if retry else response
+    
+    async def agenerate_variants_multi(self,
+                                       leads: List[Dict],
+                                       semaphore: asyncio.Semaphore = None,
+                                       limiter: _RateLimiter = None,
+                                       aclient=None,
+                                       models: Dict[int, str] = None) -> Dict[int, Dict[str, str]]:
+        """
+        Generate variants for several leads with a single API call
+        
+        Sends the system prompt once for the whole group, so a batch that is
+        limited by requests per minute rather than tokens needs fewer calls.
+        Leads missing from the response get the fallback variants.
+        
+        Args:
+            leads: Lead dicts (must include 'id')
+            semaphore: Caps how many API calls run at once across a batch
+            limiter: Shared RPM/TPM budget every API call waits on
+            aclient: AsyncOpenAI client of the current run (opened for this
+                call if not given)
+            models: Filled in with what produced each lead's variants (the
+                model, 'cache' or 'fallback'), keyed by lead ID
             
-            elif current_variant and line:
-                if not line.startswith('**') and not line.startswith('---') and not line.startswith('❌') and not line.startswith('✅'):
-                    current_message.append(line)
+        Returns:
+            Dict mapping lead ID to its variant_a, variant_b and variant_c
+        """
+        
+        variants_by_lead = {}
+        for lead in leads:
+            if self._is_sparse(lead):
+                variants_by_lead[lead['id']] = self._get_fallback_variants(lead)
+                self._record_model(models, lead, GENERATED_BY_FALLBACK)
+                continue
+            cached = self._cache_get(lead)
+            if cached:
+                variants_by_lead[lead['id']] = cached
+                self._record_model(models, lead, GENERATED_BY_CACHE)
+        leads = [lead for lead in leads if lead['id'] not in variants_by_lead]
+        if not leads:
+            return variants_by_lead
+        
+        entries = {}
+        try:
+            async with _async_openai_client(self.api_key, aclient) as aclient:
+                response = await self._acomplete(aclient, self._build_multi_lead_request(leads), semaphore, limiter)
+            parsed = json.loads(response.choices[0].message.content)
+            entries = {item.get('lead_id'): item for item in parsed.get('leads', []) if isinstance(item, dict)}
+        except Exception as e:
+            self._log_generation_error(f"variants for {len(leads)} leads", e)
+        
+        for lead in leads:
+            variants = self._clean_variants(entries.get(lead['id'], {}))
+            if len(variants) < 3:
+                logger.warning("⚠️ Incomplete variants for lead %s, using fallback", lead['id'])
+                variants = self._get_fallback_variants(lead)
+                self._record_model(models, lead, GENERATED_BY_FALLBACK)
+            else:
+                self._cache_set(lead, variants)
+                self._record_model(models, lead, self.model)
+            variants_by_lead[lead['id']] = variants
+        
+        return variants_by_lead
+    
+    def _create(self, request: Dict):
+        """Run one chat completion, retrying rate limits and transient errors with jittered backoff"""
+        
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                return self.client.chat.completions.create(**request)
+            except TRANSIENT_ERRORS as e:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                delay = _backoff_delay(attempt)
+                logger.warning("⚠️ %s on attempt %d/%d, retrying in %.1fs", type(e).__name__, attempt, MAX_ATTEMPTS, delay)
+                self._count_retry()
+                time.sleep(delay)
+    
+    async def _acreate(self, aclient, request: Dict, semaphore: asyncio.Semaphore = None, limiter: _RateLimiter = None):
+        """Run one chat completion through `aclient`, retrying rate limits and transient errors with jittered backoff"""
+        
+        estimated_tokens = _estimate_request_tokens(request['messages'], request['max_tokens'], n=1) if limiter else 0
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            if limiter is not None:
+                await limiter.acquire(estimated_tokens)
+            try:
+                if semaphore is None:
+                    return await aclient.chat.completions.create(**request)
+                async with semaphore:
+                    return await aclient.chat.completions.create(**request)
+            except TRANSIENT_ERRORS as e:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                delay = _backoff_delay(attempt)
+                logger.warning("⚠️ %s on attempt %d/%d, retrying in %.1fs", type(e).__name__, attempt, MAX_ATTEMPTS, delay)
+                self._count_retry()
+                await asyncio.sleep(delay)
+    
+    @staticmethod
+    def _count_retry():
+        """Add a retried API call to the current batch's results, if any"""
+        results = _batch_results.get()
+        if results is not None:
+            results['retries'] += 1
+    
+    @staticmethod
+    def _log_generation_error(what: str, error: Exception):
+        """Log why generation fell back: a transient error that outlasted the retries, or a real failure"""
+        if isinstance(error, TRANSIENT_ERRORS):
+            logger.warning("⚠️ %s still failing after %d attempts on %s, using fallback",
+                           type(error).__name__, MAX_ATTEMPTS, what)
+        else:
+            logger.error("❌ Error generating %s: %s", what, error)
+    
+    def _parse_variants(self, content: str, trim: bool = True) -> Dict[str, str]:
+        """Parse the JSON response into a variant dictionary (empty if it isn't valid JSON)"""
         
-        # Add last variant
-        if current_variant and current_message:
-            variants[current_variant] = ' '.join(current_message).strip()
+        try:
+            parsed = json.loads(content)
+        except ValueError:
+            return {}
+        if not isinstance(parsed, dict):
+            return {}
+        return self._clean_variants(parsed, trim)
+    
+    def _clean_variants(self, parsed: Dict, trim: bool = True) -> Dict[str, str]:
+        """Normalize the variant fields of a parsed response"""
         
-        # Clean up variants
-        for key in variants:
-            variants[key] = variants[key].strip('"\'').strip()
-            if len(variants[key]) > 200:
-                variants[key] = variants[key][:197] + "..."
+        variants = {}
+        for key in ('variant_a', 'variant_b', 'variant_c'):
+            message = ' '.join(str(parsed.get(key) or '').split()).strip('"\'').strip()
+            if trim and len(message) > VARIANT_MAX_CHARS:
+                message = MessageGenerator._trim_to_limit(message, VARIANT_MAX_CHARS)
+            if message:
+                variants[key] = message
         
         return variants
     
     def _get_fallback_variants(self, lead: Dict) -> Dict[str, str]:
         """Natural fallback variants if API fails"""
         
-        first_name = lead.get('name', '').split()[0] if lead.get('name') else 'there'
-        title = lead.get('title', 'your role')
-        company = lead.get('company', 'your company')
-        
-        return {
-            'variant_a': f"Hey {first_name}, fellow {title} here - would love to connect and swap notes",
-            'variant_b': f"Hi {first_name}, I help {title}s with lead gen. Worth a quick chat?",
-            'variant_c': f"{first_name}, respect what you're building at {company}. Let's connect?"
+        fields = {
+            'first_name': self._field(lead, 'name', 'there').split()[0],
+            'title': self._field(lead, 'title', 'professional'),
+            'company': self._field(lead, 'company', 'your company')
         }
+        return {key: template.format_map(fields) for key, template in FALLBACK_VARIANT_TEMPLATES}
     
     def _get_template_fallback_variants(self, filled_template: str, lead: Dict) -> Dict[str, str]:
         """Fallback variants based on template if AI fails"""
@@ -329,18 +757,48 @@ VARIANT C - Compliment-based (like genuine respect):
             'variant_c': truncated
         }
     
-    def batch_generate(self, lead_ids: List[int], max_leads: int = 20, template_id: Optional[int] = None) -> Dict:
+    def batch_generate(self,
+                       lead_ids: List[int],
+                       max_leads: int = 20,
+                       template_id: Optional[int] = None,
+                       use_batch_api: bool = False,
+                       rpm: Optional[int] = None,
+                       tpm: Optional[int] = None,
+                       leads_per_request: int = 1,
+                       ab_test_id: Optional[int] = None) -> Dict:
         """
         Generate A/B/C variants for multiple leads
         
+        Sync wrapper around abatch_generate (run on the shared background loop,
+        so repeat batches reuse its connections), or a Batch API run for
+        large non-interactive backfills.
+        
         Args:
             lead_ids: List of lead IDs to generate messages for
             max_leads: Maximum number of leads to process
             template_id: Optional template ID to use for all leads
+            use_batch_api: Submit every request as one OpenAI batch (half the
+                price, no rate limits, up to 24h turnaround) and block until
+                it finishes
+            rpm: Requests-per-minute budget (see abatch_generate)
+            tpm: Tokens-per-minute budget (see abatch_generate)
+            leads_per_request: Leads to generate for per API call (see abatch_generate)
+            ab_test_id: A/B test the saved messages belong to
             
         Returns:
             Dict with results summary
         """
+        if use_batch_api:
+            return self._batch_api_generate(lead_ids[:max_leads], template_id=template_id, ab_test_id=ab_test_id)
+        return _run_sync(self.abatch_generate(lead_ids, max_leads=max_leads, template_id=template_id,
+                                              rpm=rpm, tpm=tpm, leads_per_request=leads_per_request,
+                                              ab_test_id=ab_test_id))
+    
+    def _batch_api_generate(self,
+                            lead_ids: List[int],
+                            template_id: Optional[int] = None,
+                            ab_test_id: Optional[int] = None) -> Dict:
+        """Generate variants for leads through one OpenAI Batch API job and save them"""
         
         results = {
             'successful': 0,
@@ -350,73 +808,377 @@ VARIANT C - Compliment-based (like genuine respect):
             'template_used': template_id is not None
         }
         
-        lead_ids = lead_ids[:max_leads]
+        template_text = self._load_template(template_id)
+        if template_text is None:
+            template_id = None
         
-        if template_id:
-            template_data = db_manager.get_message_template(template_id)
-            if template_data:
-                print(f"\n🎨 Using template: {template_data['template'][:50]}...")
+        # One request per lead that has no messages yet
+        leads = db_manager.get_leads_by_ids(lead_ids)
+        has_messages = db_manager.get_lead_ids_with_messages(lead_ids)
+        pending = {}
+        lines = []
+        for lead_id in lead_ids:
+            lead = leads.get(lead_id)
+            if not lead or lead_id in has_messages:
+                results['failed'] += 1
+                continue
+            
+            filled_template = self._fill_template_placeholders(template_text, lead) if template_text else None
+            body = self._build_template_request(lead, filled_template) if filled_template else self._build_request(lead)
+            custom_id = f"lead_{lead_id}"
+            pending[custom_id] = (lead, filled_template)
+            lines.append(json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': '/v1/chat/completions', 'body': body}))
+        
+        if not lines:
+            return results
+        
+        input_file = self.client.files.create(file=('requests.jsonl', '\n'.join(lines).encode('utf-8')), purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h'
+        )
+        logger.info("📦 Submitted batch %s with %d requests", batch.id, len(lines))
+        
+        delay = BATCH_POLL_SECONDS
+        while batch.status not in BATCH_FINAL_STATUSES:
+            time.sleep(delay)
+            delay = min(delay * 2, BATCH_MAX_POLL_SECONDS)
+            batch = self.client.batches.retrieve(batch.id)
+            logger.debug("📦 Batch %s: %s", batch.id, batch.status)
+        
+        if batch.status != 'completed' or not batch.output_file_id:
+            logger.error("❌ Batch %s ended with status %s", batch.id, batch.status)
+            results['failed'] += len(pending)
+            return results
+        
+        rows = []
+        models = {}
+        for line in self.client.files.content(batch.output_file_id).text.splitlines():
+            item = json.loads(line)
+            lead, filled_template = pending.pop(item['custom_id'], (None, None))
+            response = item.get('response') or {}
+            if lead is None:
+                continue
+            if response.get('status_code') != 200:
+                results['failed'] += 1
+                continue
+            
+            completion = ChatCompletion.model_validate(response['body'])
+            if filled_template:
+                variants = self._template_variants_from_response(completion, filled_template, lead, models)
             else:
-                print(f"\n⚠️ Template {template_id} not found, using default generation")
-                template_id = None
+                variants = self._variants_from_response(completion, lead, models)
+            rows.extend(self._variant_rows(lead['id'], variants, template_id, generated_by=models[lead['id']]))
+            results['successful'] += 1
+            results['lead_ids_processed'].append(lead['id'])
+        
+        # Requests missing from the output failed inside the batch
+        results['failed'] += len(pending)
+        
+        for start in range(0, len(rows), SAVE_BATCH_SIZE):
+            results['messages_created'] += db_manager.create_messages_bulk(rows[start:start + SAVE_BATCH_SIZE], ab_test_id)
+        
+        logger.info("✅ Complete: %d leads, %d messages created%s", results['successful'],
+                    results['messages_created'], " (template-based)" if template_id else "")
+        
+        return results
+    
+    def _load_template(self, template_id: Optional[int]) -> Optional[str]:
+        """Template text for a batch, or None when no template is used or it doesn't exist"""
+        if not template_id:
+            return None
+        
+        template_data = db_manager.get_message_template(template_id)
+        if not template_data:
+            logger.warning("⚠️ Template %s not found, using default generation", template_id)
+            return None
+        
+        logger.info("🎨 Using template: %s...", template_data['template'][:50])
+        return template_data['template']
+    
+    @staticmethod
+    def _structural_key(lead: Dict, template_text: Optional[str] = None) -> tuple:
+        """Leads with the same key get the same message apart from the name"""
+        key = (
+            normalize_title(lead.get('title')),
+            (lead.get('company') or '').strip().lower(),
+            lead.get('persona_id')
+        )
+        if template_text:
+            # The template request also carries the headline, and placeholders
+            # copy their field as is, so those have to match exactly
+            key += (lead.get('headline'),) + tuple(
+                lead.get(field) for placeholder, field in TEMPLATE_LEAD_FIELDS.items()
+                if f'{{{placeholder}}}' in template_text
+            )
+        return key
+    
+    @staticmethod
+    def _readdress_variants(variants: Dict[str, str], source: Dict, lead: Dict) -> Dict[str, str]:
+        """Variants written for `source`, with its name swapped for this lead's first name"""
+        first_name = lead.get('name', '').split()[0] if lead.get('name') else 'there'
+        return {
+            key: StructuralMessageCache._to_template(message, source.get('name', ''), '').replace(NAME_PLACEHOLDER, first_name)
+            for key, message in variants.items()
+        }
+    
+    def _variant_rows(self,
+                      lead_id: int,
+                      variants: Dict[str, str],
+                      template_id: Optional[int] = None,
+                      reused_from: Optional[int] = None,
+                      generated_by: Optional[str] = None) -> List[Dict]:
+        """
+        Message rows for one lead's variants
+        
+        Args:
+            lead_id: Lead the rows are for
+            variants: Dict with keys variant_a, variant_b, variant_c
+            template_id: Template the variants were personalized from
+            reused_from: Lead whose generation they were copied from
+            generated_by: What produced the variants (defaults to the model)
+            
+        Returns:
+            One row per variant, ready for create_messages_bulk
+        """
+        rows = []
+        for variant_key, content in variants.items():
+            variant_letter = variant_key.split('_')[1].upper()
+            prompt_used = f"Template {template_id} - Variant {variant_letter}" if template_id else f"ABC variant {variant_letter}"
+            if reused_from is not None:
+                prompt_used += f" (reused from lead {reused_from})"
+            rows.append({
+                'lead_id': lead_id,
+                'message_type': 'connection_request',
+                'content': content,
+                'variant': variant_letter,
+                'generated_by': generated_by or self.model,
+                'prompt_used': prompt_used,
+                'status': 'draft'
+            })
+        return rows
+    
+    async def abatch_generate(self,
+                              lead_ids: List[int],
+                              max_leads: int = 20,
+                              template_id: Optional[int] = None,
+                              rpm: Optional[int] = None,
+                              tpm: Optional[int] = None,
+                              leads_per_request: int = 1,
+                              ab_test_id: Optional[int] = None) -> Dict:
+        """
+        Generate A/B/C variants for multiple leads concurrently
+        
+        Leads are processed in parallel with at most `max_concurrent` OpenAI
+        calls in flight; rate-limited calls are retried with backoff. When an
+        RPM/TPM budget is given (or the warm-up probe has read the account's
+        limits), calls also wait on a shared token bucket so the batch stays
+        under those limits instead of relying on 429 retries.
         
-        print(f"\n🎨 Generating A/B/C messages for {len(lead_ids)} leads...")
+        Args:
+            lead_ids: List of lead IDs to generate messages for
+            max_leads: Maximum number of leads to process
+            template_id: Optional template ID to use for all leads
+            rpm: Requests-per-minute budget
+            tpm: Tokens-per-minute budget
+            leads_per_request: Generate for this many leads per API call
+                (ignored with a template). Cuts the request count when the
+                RPM limit binds before the TPM limit.
+            ab_test_id: A/B test the saved messages belong to, set in the
+                same INSERT as the messages
+            
+        Returns:
+            Dict with results summary
+        """
         
+        results = {
+            'successful': 0,
+            'failed': 0,
+            'messages_created': 0,
+            'lead_ids_processed': [],
+            'template_used': template_id is not None,
+            'retries': 0,
+            'skipped_empty': 0
+        }
+        
+        # Every task of this run sees the same results (a call shared with
+        # another batch through _in_flight counts toward the batch that sent it)
+        token = _batch_results.set(results)
+        try:
+            return await self._abatch_generate(results, lead_ids[:max_leads], template_id, rpm, tpm,
+                                               leads_per_request, ab_test_id)
+        finally:
+            _batch_results.reset(token)
+    
+    async def _abatch_generate(self,
+                               results: Dict,
+                               lead_ids: List[int],
+                               template_id: Optional[int],
+                               rpm: Optional[int],
+                               tpm: Optional[int],
+                               leads_per_request: int,
+                               ab_test_id: Optional[int]) -> Dict:
+        """Body of abatch_generate, filling in `results`"""
+        
+        # Database calls run in a worker thread; this loop may be the shared
+        # background loop that every sync caller's requests are running on
+        template_text = await asyncio.to_thread(self._load_template, template_id)
+        if template_text is None:
+            template_id = None
+        
+        logger.info("🎨 Generating A/B/C messages for %d leads (%d at a time)...", len(lead_ids), self.max_concurrent)
+        
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        limiter = None
+        if rpm or tpm or _RATE_LIMITS:
+            limiter = _RateLimiter(rpm or _RATE_LIMITS.get('requests_per_minute', 500),
+                                   tpm or _RATE_LIMITS.get('tokens_per_minute', 30000))
+        leads = await asyncio.to_thread(db_manager.get_leads_by_ids, lead_ids)
+        has_messages = await asyncio.to_thread(db_manager.get_lead_ids_with_messages, lead_ids)
+        pending_rows = []
+        pending_leads = []
+        save_lock = asyncio.Lock()
+        # What produced each representative's variants, for generated_by
+        models = {}
+        
+        async def flush():
+            # Leads only count as successful once their rows are committed
+            rows, batch_leads = pending_rows[:], pending_leads[:]
+            pending_rows.clear()
+            pending_leads.clear()
+            async with save_lock:
+                try:
+                    saved = await asyncio.to_thread(db_manager.create_messages_bulk, rows, ab_test_id)
+                except Exception as e:
+                    logger.error("❌ Error saving messages: %s", e)
+                    saved = 0
+            
+            if saved < len(rows):
+                logger.error("❌ Could not save messages for leads %s", batch_leads)
+                results['failed'] += len(batch_leads)
+                return
+            results['messages_created'] += saved
+            results['successful'] += len(batch_leads)
+            results['lead_ids_processed'].extend(batch_leads)
+        
+        # Leads without existing messages, with their position for progress logs
+        todo = []
         for i, lead_id in enumerate(lead_ids, 1):
-            try:
-                lead = db_manager.get_lead_by_id(lead_id)
-                
-                if not lead:
-                    print(f"❌ [{i}/{len(lead_ids)}] Lead {lead_id} not found")
-                    results['failed'] += 1
-                    continue
-                
-                print(f"\n📝 [{i}/{len(lead_ids)}] {lead['name']} ({lead['company']})")
-                
-                # Check if messages already exist
-                existing = db_manager.get_messages_by_lead(lead_id)
-                if existing:
-                    print(f"   ⚠️ Messages already exist, skipping...")
-                    results['failed'] += 1
-                    continue
+            lead = leads.get(lead_id)
+            
+            if not lead:
+                logger.warning("❌ [%d/%d] Lead %s not found", i, len(lead_ids), lead_id)
+                results['failed'] += 1
+                continue
+            
+            # Check if messages already exist
+            if lead_id in has_messages:
+                logger.info("⚠️ [%d/%d] %s: messages already exist, skipping...", i, len(lead_ids), lead['name'])
+                results['failed'] += 1
+                continue
+            
+            todo.append((i, lead))
+        
+        if not template_text:
+            results['skipped_empty'] = sum(1 for _, lead in todo if self._is_sparse(lead))
+            if results['skipped_empty']:
+                logger.info("⏭️ %d leads have too little profile data, using fallback copy without an API call",
+                            results['skipped_empty'])
+        
+        # Leads with the same title, company and persona (common with a target
+        # account list) share one generation, re-addressed to each of them
+        representatives = {}
+        duplicates = {}
+        for i, lead in todo:
+            key = self._structural_key(lead, template_text)
+            if key in representatives:
+                duplicates[representatives[key][1]['id']].append((i, lead))
+            else:
+                representatives[key] = (i, lead)
+                duplicates[lead['id']] = []
+        if len(representatives) < len(todo):
+            logger.info("♻️ %d leads share a title, company and persona with another lead, reusing their variants",
+                        len(todo) - len(representatives))
+        todo = list(representatives.values())
+        
+        def lead_rows(i: int, lead: Dict, variants: Dict[str, str]) -> List[tuple]:
+            """(position, lead, rows) for a lead and the duplicates that reuse its variants"""
+            generated_by = models.get(lead['id'])
+            batch = [(i, lead, self._variant_rows(lead['id'], variants, template_id, generated_by=generated_by))]
+            for j, duplicate in duplicates[lead['id']]:
+                readdressed = self._readdress_variants(variants, lead, duplicate)
+                batch.append((j, duplicate, self._variant_rows(duplicate['id'], readdressed, template_id, lead['id'],
+                                                               generated_by)))
+            return batch
+        
+        def save(batch: List[tuple]):
+            # Queue the variants; they are saved in batches across leads (see flush_if_full)
+            for i, lead, rows in batch:
+                pending_rows.extend(rows)
+                pending_leads.append(lead['id'])
                 
+                logger.debug("📝 [%d/%d] %s (%s)", i, len(lead_ids), lead['name'], lead['company'])
+                for row in rows:
+                    logger.debug("   ✅ Variant %s: %s...", row['variant'], row['content'][:60])
+        
+        async def flush_if_full():
+            if len(pending_rows) >= SAVE_BATCH_SIZE:
+                await flush()
+        
+        async def process(aclient, i: int, lead: Dict):
+            try:
                 # Generate variants (with or without template)
-                variants = self.generate_variants(lead, template_id=template_id)
-                
-                # Save to database
-                for variant_key, content in variants.items():
-                    variant_letter = variant_key.split('_')[1].upper()
-                    
-                    prompt_used = f"Template {template_id} - Variant {variant_letter}" if template_id else f"ABC variant {variant_letter}"
-                    
-                    message_id = db_manager.create_message(
-                        lead_id=lead_id,
-                        message_type='connection_request',
-                        content=content,
-                        variant=variant_letter,
-                        generated_by='gpt-4',
-                        prompt_used=prompt_used,
-                        status='draft'
-                    )
-                    
-                    if message_id:
-                        results['messages_created'] += 1
-                        print(f"   ✅ Variant {variant_letter}: {content[:60]}...")
+                variants = await self.agenerate_variants(lead, template_text=template_text,
+                                                         semaphore=semaphore, limiter=limiter, aclient=aclient,
+                                                         models=models)
+                save(lead_rows(i, lead, variants))
                 
-                results['successful'] += 1
-                results['lead_ids_processed'].append(lead_id)
+            except Exception as e:
+                logger.error("❌ Error processing lead %s: %s", lead['id'], e)
+                results['failed'] += 1 + len(duplicates[lead['id']])
+                return
+            # A failed save is charged to the leads in that batch, not this one
+            await flush_if_full()
+        
+        async def process_group(aclient, group: List):
+            try:
+                variants_by_lead = await self.agenerate_variants_multi(
+                    [lead for _, lead in group], semaphore=semaphore, limiter=limiter, aclient=aclient,
+                    models=models
+                )
+                save([entry for i, lead in group for entry in lead_rows(i, lead, variants_by_lead[lead['id']])])
                 
             except Exception as e:
-                print(f"❌ Error processing lead {lead_id}: {str(e)}")
-                results['failed'] += 1
+                logger.error("❌ Error processing leads %s: %s", [lead['id'] for _, lead in group], e)
+                results['failed'] += sum(1 + len(duplicates[lead['id']]) for _, lead in group)
+                return
+            await flush_if_full()
         
-        print(f"\n✅ Complete: {results['successful']} leads, {results['messages_created']} messages created")
-        if template_id:
-            print(f"🎨 Template-based generation used")
+        # One client for the batch, closed before this event loop ends
+        async with _async_openai_client(self.api_key) as aclient:
+            if leads_per_request > 1 and not template_text:
+                groups = [todo[start:start + leads_per_request] for start in range(0, len(todo), leads_per_request)]
+                await asyncio.gather(*(process_group(aclient, group) for group in groups))
+            else:
+                await asyncio.gather(*(process(aclient, i, lead) for i, lead in todo))
+        if pending_rows:
+            await flush()
+        
+        logger.info("✅ Complete: %d leads, %d messages created%s", results['successful'],
+                    results['messages_created'], " (template-based)" if template_id else "")
+        if self.cache is not None:
+            logger.info("♻️ Message cache so far: %d hits, %d misses", self.cache.stats['hits'], self.cache.stats['misses'])
         
         return results
 
 
+@functools.lru_cache(maxsize=8)
+def _get_generator(api_key: Optional[str] = None) -> ABCMessageGenerator:
+    """Shared generator per API key, so repeat calls skip the credentials read and reuse its sync client and cache"""
+    return ABCMessageGenerator(api_key=api_key)
+
+
 # Quick test function
 def test_generator():
     """Test the ABC message generator"""
@@ -437,7 +1199,7 @@ def test_generator():
     print(f"Title: {lead['title']}")
     print(f"Company: {lead['company']}")
     
-    generator = ABCMessageGenerator()
+    generator = _get_generator()
     
     # Test without template
     print("\n📝 Standard Generation (no template):")
@@ -464,4 +1226,36 @@ def test_generator():
 
 
 if __name__ == "__main__":
-    test_generator()
\ No newline at end of file
+    import argparse
+    import atexit
+    import queue
+    from logging.handlers import QueueHandler, QueueListener
+    
+    parser = argparse.ArgumentParser(description='Generate A/B/C connection request variants')
+    parser.add_argument('--lead-ids', type=str, help='Comma-separated lead IDs, e.g. 1,2,3')
+    parser.add_argument('--top', type=int, help='Generate for the N highest-scoring leads')
+    parser.add_argument('--template-id', type=int, help='Message template to personalize')
+    parser.add_argument('--use-batch-api', action='store_true',
+                        help='Submit through the OpenAI Batch API (half price, up to 24h turnaround)')
+    args = parser.parse_args()
+    
+    # Workers only enqueue log records; a listener thread does the console writes
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, logging.StreamHandler())
+    listener.start()
+    atexit.register(listener.stop)
+    logging.basicConfig(level=logging.INFO, format='%(message)s', handlers=[QueueHandler(log_queue)])
+    
+    ids = [int(value) for value in (args.lead_ids or '').split(',') if value.strip()]
+    if args.top:
+        ids.extend(lead['id'] for lead in db_manager.get_top_leads(limit=args.top))
+    
+    if ids:
+        _get_generator().batch_generate(
+            ids,
+            max_leads=len(ids),
+            template_id=args.template_id,
+            use_batch_api=args.use_batch_api
+        )
+    else:
+        test_generator()
\ No newline at end of file
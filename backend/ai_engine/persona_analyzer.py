@@ -1,6 +1,6 @@
 """
 Enhanced Persona Analyzer - Extracts EVERYTHING from target documents
-Uses OpenAI GPT-4 to deeply understand persona documents and generate smart targeting
+Uses OpenAI to deeply understand persona documents and generate smart targeting
 IMPROVED: Better error handling and fallback parsing
 """
 
@@ -8,48 +8,47 @@ from openai import OpenAI
 import os
 import re
 import json
+import time
+import functools
+import zipfile
+from xml.etree import ElementTree
 from typing import Dict, List, Any
 
+try:
+    from backend.config import Config
+except ImportError:
+    class Config:
+        pass
 
-class EnhancedPersonaAnalyzer:
-    """
-    Advanced persona extraction that captures:
-    - Job titles and decision-maker roles
-    - Pain points and challenges
-    - Solutions offered
-    - Key messaging
-    - LinkedIn search keywords
+
+@functools.lru_cache(maxsize=1)
+def _lazy_prompt_cache():
     """
+    The exact-prompt response cache, imported on first use
     
-    def __init__(self, api_key: str = None):
-        self.api_key = api_key or os.environ.get('OPENAI_API_KEY')
-        if not self.api_key:
-            raise ValueError("OPENAI_API_KEY required")
-        self.client = OpenAI(api_key=self.api_key)
-    
-    def analyze_document(self, file_path: str) -> Dict[str, Any]:
-        """
-        Deep analysis of persona document
-        Returns structured data ready for scraping and messaging
-        """
-        
-        # Read document
-        text = self._read_document(file_path)
-        
-        print(f"📄 Document length: {len(text)} characters")
-        
-        prompt = f"""You are an expert at analyzing target customer documents for B2B lead generation.
+    message_cache opens the database, so importing the analyzer stays free of
+    that side effect. Returns None as a standalone script without the
+    backend package.
+    """
+    try:
+        from backend.ai_engine.message_cache import prompt_cache
+        return prompt_cache
+    except ImportError:
+        return None
+
 
-Analyze this document and extract detailed information about target personas.
+# Instructions and output format are identical for every document, so they go
+# in the system message ahead of the document; the API's automatic prompt
+# caching can then reuse that prefix across analyses.
+ANALYSIS_SYSTEM_PROMPT = """You are an expert at analyzing target customer documents and extracting structured persona data for B2B lead generation. Always return valid JSON.
 
-Document Content:
-{text}
+Analyze the document the user sends and extract detailed information about target personas.
 
 Extract and return a JSON object with this EXACT structure:
 
-{{
+{
   "personas": [
-    {{
+    {
       "name": "Clear persona name (e.g. 'Agency Owner', 'Plastic Surgeon')",
       "description": "Brief 1-2 sentence description",
       
@@ -94,7 +93,7 @@ Extract and return a JSON object with this EXACT structure:
       "age_range": "Typical age range (e.g. '30-55')",
       
       "seniority_level": "Typical seniority (e.g. 'C-Suite', 'Director-level', 'Manager')"
-    }}
+    }
   ],
   
   "industry_focus": "Primary industry or vertical from document",
@@ -108,7 +107,7 @@ Extract and return a JSON object with this EXACT structure:
     "Universal value propositions that work across personas",
     "Common pain points that all personas share"
   ]
-}}
+}
 
 IMPORTANT RULES:
 1. Extract REAL job titles that exist on LinkedIn
@@ -120,47 +119,119 @@ IMPORTANT RULES:
 
 Return ONLY the JSON object, no other text."""
 
+# Patterns for the regex fallback, compiled once
+_PERSONA_HEADER_RES = (
+    re.compile(r'(?:^|\n)(?:\d+\.\s*)?([A-Z][^:\n]+(?:Persona|Owner|Manager|Director|Surgeon|Consultant)[^:\n]*)', re.MULTILINE),
+    re.compile(r'(?:^|\n)##?\s*(\d+\.\s*[A-Z][^\n]+Persona[^\n]*)', re.MULTILINE),
+)
+_NUMBER_PREFIX_RE = re.compile(r'^\d+\.\s*')
+_DASH_SUFFIX_RE = re.compile(r'\s*--.*$')
+_ALL_TITLES_RE = re.compile(
+    r'\b(CEO|CTO|CMO|CFO|COO|Founder|Co-Founder|Director|Manager|Head|Lead|Owner|Partner|Principal'
+    r'|Surgeon|Doctor|Physician|Consultant|Advisor|Coach)\b',
+    re.IGNORECASE
+)
+_PAIN_SECTION_RE = re.compile(r'Pain\s+Points?\s*:?\s*\n(.*?)(?:\n\n|\n[A-Z]|\Z)', re.DOTALL | re.IGNORECASE)
+_SOLUTION_SECTION_RES = tuple(re.compile(pattern, re.DOTALL | re.IGNORECASE) for pattern in (
+    r'Solutions?\s+(?:You\s+)?Offer(?:ed)?\s*:?\s*\n(.*?)(?:\n\n|\n[A-Z]|\Z)',
+    r'Services?\s*:?\s*\n(.*?)(?:\n\n|\n[A-Z]|\Z)',
+    r'Key\s+Message\s*:?\s*\n(.*?)(?:\n\n|\Z)',
+))
+_BULLET_RE = re.compile(r'[-•·*]\s*(.+)')
+
+# Element tags read when streaming text out of a .docx
+_W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_DOCX_PARAGRAPH = _W_NS + 'p'
+_DOCX_RUN = _W_NS + 'r'
+_DOCX_TEXT = _W_NS + 't'
+_DOCX_TAB = _W_NS + 'tab'
+_DOCX_BREAKS = {_W_NS + 'br', _W_NS + 'cr'}
+
+# Batch API polling: start at 10s between checks, back off to at most 5 minutes
+BATCH_POLL_SECONDS = 10
+BATCH_MAX_POLL_SECONDS = 300
+BATCH_FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# Structured output: the API guarantees a response matching this schema
+# (strict mode needs every field required and no extra properties)
+_STRING = {"type": "string"}
+_STRING_LIST = {"type": "array", "items": _STRING}
+
+
+def _object_schema(properties: Dict[str, Dict]) -> Dict:
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
+ANALYSIS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "personas",
+        "strict": True,
+        "schema": _object_schema({
+            "personas": {"type": "array", "items": _object_schema({
+                "name": _STRING,
+                "description": _STRING,
+                "job_titles": _STRING_LIST,
+                "decision_maker_roles": _STRING_LIST,
+                "company_types": _STRING_LIST,
+                "pain_points": _STRING_LIST,
+                "solutions": _STRING_LIST,
+                "key_message": _STRING,
+                "message_tone": _STRING,
+                "linkedin_keywords": _STRING_LIST,
+                "age_range": _STRING,
+                "seniority_level": _STRING
+            })},
+            "industry_focus": _STRING,
+            "service_offerings": _STRING_LIST,
+            "common_hooks": _STRING_LIST
+        })
+    }
+}
+
+
+class EnhancedPersonaAnalyzer:
+    """
+    Advanced persona extraction that captures:
+    - Job titles and decision-maker roles
+    - Pain points and challenges
+    - Solutions offered
+    - Key messaging
+    - LinkedIn search keywords
+    """
+    
+    def __init__(self, api_key: str = None, model: str = None):
+        self.api_key = api_key or os.environ.get('OPENAI_API_KEY')
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY required")
+        self.client = OpenAI(api_key=self.api_key)
+        self.model = model or getattr(Config, 'PERSONA_MODEL', 'gpt-4o-mini')
+    
+    def analyze_document(self, file_path: str) -> Dict[str, Any]:
+        """
+        Deep analysis of persona document
+        Returns structured data ready for scraping and messaging
+        """
+        
+        # Read document
+        text = self._read_document(file_path)
+        
+        print(f"📄 Document length: {len(text)} characters")
+        
         try:
-            print("🤖 Calling OpenAI GPT-4...")
+            print(f"🤖 Calling OpenAI {self.model}...")
             
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an expert at analyzing target customer documents and extracting structured persona data. Always return valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=4000
-            )
-            
-            content = response.choices[0].message.content.strip()
+            content = self._cached_completion(self._analysis_request(text))
             
             print(f"📥 Received response ({len(content)} chars)")
             print(f"First 200 chars: {content[:200]}")
             
-            # Try multiple JSON extraction methods
-            result = self._extract_json_from_response(content)
-            
-            if not result:
-                print("⚠️ No valid JSON found, trying fallback extraction...")
-                result = self._fallback_extraction(text)
-            
-            # Validate we have personas
-            if not result.get('personas'):
-                print("⚠️ No personas in result, trying fallback...")
-                result = self._fallback_extraction(text)
-            
-            # Enrich personas with computed fields
-            for persona in result.get('personas', []):
-                # Generate smart search query
-                persona['smart_search_query'] = self._generate_smart_search_query(persona)
-                
-                # Generate message hooks
-                persona['message_hooks'] = self._generate_message_hooks(persona)
-            
-            print(f"✅ Successfully extracted {len(result.get('personas', []))} personas")
-            
-            return result
+            return self._result_from_content(content, text)
         
         except Exception as e:
             print(f"❌ Persona analysis error: {str(e)}")
@@ -177,41 +248,164 @@ Return ONLY the JSON object, no other text."""
                 print(f"❌ Fallback also failed: {str(fallback_error)}")
                 raise e
     
-    def _extract_json_from_response(self, content: str) -> Dict[str, Any]:
-        """Try multiple methods to extract JSON from GPT response"""
+    def analyze_documents(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Analyze several persona documents through one OpenAI Batch API job
         
-        # Method 1: Direct JSON parse
-        try:
-            return json.loads(content)
-        except:
-            pass
+        Half the price of separate calls and no rate limits, but a batch can
+        take minutes to hours and this blocks until it finishes. Documents
+        with a cached analysis skip the batch; a single document is analyzed
+        directly.
         
-        # Method 2: Find JSON in markdown code blocks
-        json_match = re.search(r'```json\s*(\{.*?\})\s*```', content, re.DOTALL)
-        if json_match:
-            try:
-                return json.loads(json_match.group(1))
-            except:
-                pass
+        Args:
+            file_paths: Documents to analyze
+            
+        Returns:
+            One analysis result per document, in the same order
+        """
+        
+        if len(file_paths) <= 1:
+            return [self.analyze_document(path) for path in file_paths]
         
-        # Method 3: Find any JSON object
-        json_match = re.search(r'\{.*\}', content, re.DOTALL)
-        if json_match:
+        texts = [self._read_document(path) for path in file_paths]
+        requests = [self._analysis_request(text) for text in texts]
+        prompt_cache = _lazy_prompt_cache()
+        keys = [prompt_cache.make_key(request) if prompt_cache is not None else None for request in requests]
+        contents = {}
+        
+        lines = []
+        for i, (request, key) in enumerate(zip(requests, keys)):
+            cached = prompt_cache.get(key) if key is not None else None
+            if cached:
+                contents[i] = cached[0]
+            else:
+                lines.append(json.dumps({'custom_id': f"doc_{i}", 'method': 'POST', 'url': '/v1/chat/completions', 'body': request}))
+        
+        if lines:
             try:
-                return json.loads(json_match.group())
-            except:
-                pass
+                contents.update(self._run_batch(lines))
+            except Exception as e:
+                print(f"❌ Batch analysis error: {str(e)}")
+        
+        results = []
+        for i, (path, text) in enumerate(zip(file_paths, texts)):
+            content = contents.get(i, '')
+            if not content:
+                print(f"⚠️ No response for {path}")
+            elif keys[i] is not None:
+                prompt_cache.set(keys[i], [content])
+            results.append(self._result_from_content(content, text))
+        
+        return results
+    
+    def _run_batch(self, lines: List[str]) -> Dict[int, str]:
+        """Submit JSONL request lines as one batch, wait for it, and return response content by document index"""
+        
+        input_file = self.client.files.create(file=('requests.jsonl', '\n'.join(lines).encode('utf-8')), purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h'
+        )
+        print(f"📦 Submitted batch {batch.id} with {len(lines)} documents")
+        
+        delay = BATCH_POLL_SECONDS
+        while batch.status not in BATCH_FINAL_STATUSES:
+            time.sleep(delay)
+            delay = min(delay * 2, BATCH_MAX_POLL_SECONDS)
+            batch = self.client.batches.retrieve(batch.id)
+        
+        if batch.status != 'completed' or not batch.output_file_id:
+            print(f"❌ Batch {batch.id} ended with status {batch.status}")
+            return {}
+        
+        contents = {}
+        for line in self.client.files.content(batch.output_file_id).text.splitlines():
+            item = json.loads(line)
+            response = item.get('response') or {}
+            if response.get('status_code') == 200:
+                index = int(item['custom_id'].split('_', 1)[1])
+                contents[index] = (response['body']['choices'][0]['message']['content'] or '').strip()
+        return contents
+    
+    def _analysis_request(self, text: str) -> Dict:
+        """Chat completion request for one document"""
+        # Temperature 0 keeps the extraction deterministic, so re-analyzing
+        # the same document can be served from the response cache
+        return {
+            'model': self.model,
+            'messages': [
+                {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+                {"role": "user", "content": f"Document Content:\n{text}"}
+            ],
+            'temperature': 0,
+            'max_tokens': 4000,
+            'response_format': ANALYSIS_RESPONSE_FORMAT
+        }
+    
+    def _result_from_content(self, content: str, text: str) -> Dict[str, Any]:
+        """Parse a response into personas (falling back to pattern extraction) and add computed fields"""
         
-        # Method 4: Clean and retry
-        try:
-            # Remove markdown code blocks
-            cleaned = re.sub(r'```json\s*', '', content)
-            cleaned = re.sub(r'```\s*', '', cleaned)
-            return json.loads(cleaned.strip())
-        except:
-            pass
+        result = self._extract_json_from_response(content)
         
-        return None
+        if not result:
+            print("⚠️ No valid JSON found, trying fallback extraction...")
+            result = self._fallback_extraction(text)
+        
+        # Validate we have personas
+        if not result.get('personas'):
+            print("⚠️ No personas in result, trying fallback...")
+            result = self._fallback_extraction(text)
+        
+        # Enrich personas with computed fields
+        for persona in result.get('personas', []):
+            # Generate smart search query
+            persona['smart_search_query'] = self._generate_smart_search_query(persona)
+            
+            # Generate message hooks
+            persona['message_hooks'] = self._generate_message_hooks(persona)
+        
+        print(f"✅ Successfully extracted {len(result.get('personas', []))} personas")
+        
+        return result
+    
+    def _cached_completion(self, request: Dict) -> str:
+        """
+        Run a chat completion, reusing the stored response for an identical request
+        
+        Keyed on a hash of the whole request (model, messages, sampling
+        settings), so the same document is only sent to the API once.
+        """
+        prompt_cache = _lazy_prompt_cache()
+        key = prompt_cache.make_key(request) if prompt_cache is not None else None
+        if key is not None:
+            cached = prompt_cache.get(key)
+            if cached:
+                print("♻️ Using cached analysis for this document")
+                return cached[0]
+        
+        response = self.client.chat.completions.create(**request)
+        content = response.choices[0].message.content.strip()
+        
+        usage = getattr(response, 'usage', None)
+        details = getattr(usage, 'prompt_tokens_details', None)
+        if details is not None and usage.prompt_tokens:
+            cached_tokens = details.cached_tokens or 0
+            print(f"📊 Prompt cache: {cached_tokens}/{usage.prompt_tokens} input tokens cached ({cached_tokens / usage.prompt_tokens:.0%})")
+        
+        if key is not None:
+            prompt_cache.set(key, [content])
+        return content
+    
+    def _extract_json_from_response(self, content: str) -> Dict[str, Any]:
+        """Parse the structured-output response (None if it isn't a JSON object, e.g. a refusal)"""
+        if not content or not content.lstrip().startswith('{'):
+            return None
+        try:
+            result = json.loads(content)
+        except ValueError:
+            return None
+        return result if isinstance(result, dict) else None
     
     def _fallback_extraction(self, text: str) -> Dict[str, Any]:
         """
@@ -223,15 +417,9 @@ Return ONLY the JSON object, no other text."""
         personas = []
         
         # Look for persona sections
-        persona_patterns = [
-            r'(?:^|\n)(?:\d+\.\s*)?([A-Z][^:\n]+(?:Persona|Owner|Manager|Director|Surgeon|Consultant)[^:\n]*)',
-            r'(?:^|\n)##?\s*(\d+\.\s*[A-Z][^\n]+Persona[^\n]*)',
-        ]
-        
         persona_names = []
-        for pattern in persona_patterns:
-            matches = re.findall(pattern, text, re.MULTILINE)
-            persona_names.extend(matches)
+        for pattern in _PERSONA_HEADER_RES:
+            persona_names.extend(pattern.findall(text))
         
         # If we found persona headers, extract details for each
         if persona_names:
@@ -239,8 +427,8 @@ Return ONLY the JSON object, no other text."""
             
             for name in persona_names[:10]:  # Limit to 10 personas
                 # Clean the name
-                name = re.sub(r'^\d+\.\s*', '', name).strip()
-                name = re.sub(r'\s*--.*$', '', name).strip()  # Remove "-- The Something"
+                name = _NUMBER_PREFIX_RE.sub('', name).strip()
+                name = _DASH_SUFFIX_RE.sub('', name).strip()  # Remove "-- The Something"
                 
                 # Extract job titles (look for titles near this persona)
                 job_titles = self._extract_job_titles_near(text, name)
@@ -297,18 +485,6 @@ Return ONLY the JSON object, no other text."""
     
     def _extract_job_titles_near(self, text: str, persona_name: str) -> List[str]:
         """Extract job titles mentioned near a persona name"""
-        titles = []
-        
-        # Common job title patterns
-        title_patterns = [
-            r'\b(CEO|CTO|CMO|CFO|COO)\b',
-            r'\b(Founder|Co-Founder)\b',
-            r'\b(Director|Manager|Head|Lead)\b',
-            r'\b(Owner|Partner|Principal)\b',
-            r'\b(Surgeon|Doctor|Physician)\b',
-            r'\b(Consultant|Advisor|Coach)\b',
-        ]
-        
         # Find section with this persona
         persona_section = ''
         sections = text.split('\n\n')
@@ -321,10 +497,8 @@ Return ONLY the JSON object, no other text."""
         if not persona_section:
             persona_section = text
         
-        # Extract titles
-        for pattern in title_patterns:
-            matches = re.findall(pattern, persona_section, re.IGNORECASE)
-            titles.extend([m.title() for m in matches])
+        # Extract titles in a single pass
+        titles = [m.title() for m in _ALL_TITLES_RE.findall(persona_section)]
         
         # Deduplicate
         return list(dict.fromkeys(titles))[:10]
@@ -334,12 +508,12 @@ Return ONLY the JSON object, no other text."""
         pain_points = []
         
         # Look for pain point sections
-        pain_section_match = re.search(r'Pain\s+Points?\s*:?\s*\n(.*?)(?:\n\n|\n[A-Z]|\Z)', text, re.DOTALL | re.IGNORECASE)
+        pain_section_match = _PAIN_SECTION_RE.search(text)
         
         if pain_section_match:
             section = pain_section_match.group(1)
             # Extract bullet points or lines
-            lines = re.findall(r'[-•·*]\s*(.+)', section)
+            lines = _BULLET_RE.findall(section)
             pain_points.extend([line.strip() for line in lines if len(line.strip()) > 10])
         
         return pain_points[:7]
@@ -349,17 +523,11 @@ Return ONLY the JSON object, no other text."""
         solutions = []
         
         # Look for solution sections
-        solution_patterns = [
-            r'Solutions?\s+(?:You\s+)?Offer(?:ed)?\s*:?\s*\n(.*?)(?:\n\n|\n[A-Z]|\Z)',
-            r'Services?\s*:?\s*\n(.*?)(?:\n\n|\n[A-Z]|\Z)',
-            r'Key\s+Message\s*:?\s*\n(.*?)(?:\n\n|\Z)'
-        ]
-        
-        for pattern in solution_patterns:
-            match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+        for pattern in _SOLUTION_SECTION_RES:
+            match = pattern.search(text)
             if match:
                 section = match.group(1)
-                lines = re.findall(r'[-•·*]\s*(.+)', section)
+                lines = _BULLET_RE.findall(section)
                 solutions.extend([line.strip() for line in lines if len(line.strip()) > 10])
         
         return solutions[:7]
@@ -369,10 +537,7 @@ Return ONLY the JSON object, no other text."""
         try:
             # Handle Word documents
             if file_path.endswith('.docx'):
-                from docx import Document
-                doc = Document(file_path)
-                text = '\n'.join([para.text for para in doc.paragraphs if para.text.strip()])
-                return text
+                return self._read_docx(file_path)
             
             # Handle text files
             elif file_path.endswith('.txt') or file_path.endswith('.md'):
@@ -381,13 +546,13 @@ Return ONLY the JSON object, no other text."""
             
             # Handle PDF
             elif file_path.endswith('.pdf'):
-                import PyPDF2
+                try:
+                    from pypdf import PdfReader  # maintained successor, same API
+                except ImportError:
+                    from PyPDF2 import PdfReader
                 with open(file_path, 'rb') as f:
-                    reader = PyPDF2.PdfReader(f)
-                    text = ''
-                    for page in reader.pages:
-                        text += page.extract_text() + '\n'
-                    return text
+                    reader = PdfReader(f)
+                    return '\n'.join(page.extract_text() or '' for page in reader.pages)
             
             else:
                 raise ValueError(f"Unsupported file type: {file_path}")
@@ -396,6 +561,37 @@ Return ONLY the JSON object, no other text."""
             print(f"Error reading document: {str(e)}")
             raise
     
+    @staticmethod
+    def _read_docx(file_path: str) -> str:
+        """
+        Stream paragraph text out of a .docx without building a Document
+        
+        Parses word/document.xml incrementally and clears each paragraph once
+        its text is collected, so large documents are never held as a tree.
+        """
+        paragraphs = []
+        parts = []
+        in_run = 0  # w:tab also marks tab stops in paragraph properties; only runs hold text
+        with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as f:
+            for event, el in ElementTree.iterparse(f, events=('start', 'end')):
+                if el.tag == _DOCX_RUN:
+                    in_run += 1 if event == 'start' else -1
+                elif event == 'start':
+                    continue
+                elif el.tag == _DOCX_TEXT:
+                    parts.append(el.text or '')
+                elif in_run and el.tag == _DOCX_TAB:
+                    parts.append('\t')
+                elif in_run and el.tag in _DOCX_BREAKS:
+                    parts.append('\n')
+                elif el.tag == _DOCX_PARAGRAPH:
+                    text = ''.join(parts)
+                    if text.strip():
+                        paragraphs.append(text)
+                    parts = []
+                    el.clear()
+        return '\n'.join(paragraphs)
+    
     def _generate_smart_search_query(self, persona: Dict) -> str:
         """
         Generate optimized LinkedIn search query from persona data
@@ -466,6 +662,16 @@ Return ONLY the JSON object, no other text."""
         
         return hooks[:5]  # Max 5 hooks
     
+    @staticmethod
+    def _add_unique(items: List, seen: set, values: List, limit: int = None):
+        """Append values not already in seen, stopping once items holds limit entries"""
+        for value in values:
+            if limit is not None and len(items) >= limit:
+                return
+            if value not in seen:
+                seen.add(value)
+                items.append(value)
+    
     def extract_for_scraping(self, personas: List[Dict]) -> Dict[str, Any]:
         """
         Prepare persona data specifically for LinkedIn scraping
@@ -479,26 +685,22 @@ Return ONLY the JSON object, no other text."""
                 'industries': []
             }
         
-        # Aggregate all search data
-        all_keywords = []
-        all_job_titles = []
-        all_industries = []
+        # Aggregate search data, deduplicating as we go
+        unique_keywords = []
+        unique_titles = []
+        unique_industries = []
+        seen_keywords, seen_titles, seen_industries = set(), set(), set()
         
         for persona in personas:
             # Get smart search queries
             if persona.get('smart_search_query'):
-                all_keywords.append(persona['smart_search_query'])
+                self._add_unique(unique_keywords, seen_keywords, [persona['smart_search_query']], 5)
             
             # Get job titles
-            all_job_titles.extend(persona.get('job_titles', [])[:5])
+            self._add_unique(unique_titles, seen_titles, persona.get('job_titles', [])[:5], 10)
             
             # Get industries
-            all_industries.extend(persona.get('company_types', [])[:3])
-        
-        # Deduplicate and prioritize
-        unique_keywords = list(dict.fromkeys(all_keywords))[:5]
-        unique_titles = list(dict.fromkeys(all_job_titles))[:10]
-        unique_industries = list(dict.fromkeys(all_industries))[:5]
+            self._add_unique(unique_industries, seen_industries, persona.get('company_types', [])[:3], 5)
         
         return {
             'keywords': ' OR '.join(unique_keywords) if unique_keywords else unique_titles[0] if unique_titles else 'professional',
@@ -519,6 +721,7 @@ Return ONLY the JSON object, no other text."""
             'universal_solutions': [],
             'tone_guidelines': []
         }
+        seen_pain_points, seen_solutions, seen_tones = set(), set(), set()
         
         for persona in personas:
             persona_context = {
@@ -532,24 +735,19 @@ Return ONLY the JSON object, no other text."""
             messaging_context['personas'].append(persona_context)
             
             # Aggregate universal elements
-            messaging_context['universal_pain_points'].extend(persona.get('pain_points', [])[:2])
-            messaging_context['universal_solutions'].extend(persona.get('solutions', [])[:2])
+            self._add_unique(messaging_context['universal_pain_points'], seen_pain_points, persona.get('pain_points', [])[:2], 5)
+            self._add_unique(messaging_context['universal_solutions'], seen_solutions, persona.get('solutions', [])[:2], 5)
             
             if persona.get('message_tone'):
-                messaging_context['tone_guidelines'].append(persona['message_tone'])
-        
-        # Deduplicate
-        messaging_context['universal_pain_points'] = list(dict.fromkeys(messaging_context['universal_pain_points']))[:5]
-        messaging_context['universal_solutions'] = list(dict.fromkeys(messaging_context['universal_solutions']))[:5]
-        messaging_context['tone_guidelines'] = list(dict.fromkeys(messaging_context['tone_guidelines']))
+                self._add_unique(messaging_context['tone_guidelines'], seen_tones, [persona['message_tone']])
         
         return messaging_context
 
 
 # Factory function
-def create_analyzer(api_key: str = None) -> EnhancedPersonaAnalyzer:
+def create_analyzer(api_key: str = None, model: str = None) -> EnhancedPersonaAnalyzer:
     """Create enhanced persona analyzer instance"""
-    return EnhancedPersonaAnalyzer(api_key=api_key)
+    return EnhancedPersonaAnalyzer(api_key=api_key, model=model)
 
 
 # CLI Test
@@ -14,6 +14,9 @@ import traceback
 
 db_manager = None
 
+# Generated rows are written in one transaction per this many messages
+SAVE_BATCH_SIZE = 50
+
 def register_message_routes(app, database_manager):
     """Register all message routes"""
     global db_manager
@@ -132,12 +135,43 @@ def generate_messages():
         
         generated_count = 0
         errors = []
+        pending_rows = []
+        pending_leads = []
+        
+        def save_pending():
+            """Save the queued rows in one transaction; returns how many leads were saved"""
+            rows, names = pending_rows[:], pending_leads[:]
+            pending_rows.clear()
+            pending_leads.clear()
+            print(f"   💾 Saving {len(rows)} messages...")
+            if db_manager.create_messages_bulk(rows) == len(rows):
+                return len(names)
+            
+            # Nothing in the batch was committed, so none of its leads count
+            for name in names:
+                error_msg = f"Could not save messages for {name}"
+                print(f"   ❌ {error_msg}")
+                errors.append(error_msg)
+            return 0
         
+        # Non-numeric IDs fail on their own instead of failing the whole request
+        numeric_ids = []
         for lead_id in lead_ids:
+            try:
+                numeric_ids.append(int(lead_id))
+            except (TypeError, ValueError):
+                error_msg = f"Invalid lead ID: {lead_id!r}"
+                print(f"⚠️ {error_msg}")
+                errors.append(error_msg)
+        
+        # Fetch every selected lead (and its persona) in one query
+        leads = db_manager.get_leads_by_ids(numeric_ids)
+        
+        for lead_id in numeric_ids:
             print(f"\n📍 Processing lead {lead_id}...")
             
             # Get lead details
-            lead = db_manager.get_lead_by_id(lead_id)
+            lead = leads.get(lead_id)
             
             if not lead:
                 error_msg = f"Lead {lead_id} not found"
@@ -152,38 +186,46 @@ def generate_messages():
             try:
                 # Generate messages (3 variants)
                 print(f"   🎨 Generating messages...")
+                models = {}
                 messages = generator.generate_connection_request(
                     lead_name=lead['name'],
                     lead_title=lead.get('title', ''),
                     lead_company=lead.get('company', ''),
-                    persona_name=lead.get('persona', 'Professional'),
-                    custom_context=template_text
+                    persona_name=lead.get('persona_name') or 'Professional',
+                    persona_description=lead.get('persona_description'),
+                    custom_context=template_text,
+                    models=models
                 )
                 
                 print(f"   ✅ Generated {len(messages)} variants")
                 
-                # Save each variant
-                for variant_key, content in messages.items():
-                    variant = variant_key.split('_')[-1].upper()
-                    
-                    print(f"   💾 Saving variant {variant}...")
-                    db_manager.create_message(
-                        lead_id=lead_id,
-                        message_type='connection_request',
-                        content=content,
-                        variant=variant,
-                        generated_by='gpt-4',
-                        prompt_used='Generated from message routes'
-                    )
+                # Record what actually wrote the variants (model, cache or fallback copy)
+                generated_by = models['connection_request']
                 
-                generated_count += 1
-                print(f"   ✅ Saved all variants for {lead['name']}")
+                # Queue the variants; they are saved in batches
+                for variant_key, content in messages.items():
+                    pending_rows.append({
+                        'lead_id': lead_id,
+                        'message_type': 'connection_request',
+                        'content': content,
+                        'variant': variant_key.split('_')[-1].upper(),
+                        'generated_by': generated_by,
+                        'prompt_used': 'Generated from message routes'
+                    })
+                pending_leads.append(lead['name'])
                 
             except Exception as lead_error:
                 error_msg = f"Error generating for {lead['name']}: {str(lead_error)}"
                 print(f"   ❌ {error_msg}")
                 traceback.print_exc()
                 errors.append(error_msg)
+            
+            # A lead only counts once its rows are committed
+            if len(pending_rows) >= SAVE_BATCH_SIZE:
+                generated_count += save_pending()
+        
+        if pending_rows:
+            generated_count += save_pending()
         
         print("\n" + "="*60)
         print(f"✅ Generation complete: {generated_count} leads processed")
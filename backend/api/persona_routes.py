@@ -8,6 +8,8 @@ from flask import request, jsonify
 from datetime import datetime
 import json
 
+from backend.ai_engine.message_cache import message_cache
+
 
 def register_persona_routes(app, db_manager):
     """Register all persona management routes"""
@@ -240,6 +242,8 @@ def register_persona_routes(app, db_manager):
             success = db_manager.update_persona(persona_id, updates)
             
             if success:
+                message_cache.invalidate_persona(persona['name'])
+                
                 db_manager.log_activity(
                     activity_type='persona_updated',
                     description=f'✅ Updated persona: {name}',
@@ -280,6 +284,8 @@ def register_persona_routes(app, db_manager):
             success = db_manager.delete_persona(persona_id)
             
             if success:
+                message_cache.invalidate_persona(persona['name'])
+                
                 db_manager.log_activity(
                     activity_type='persona_deleted',
                     description=f'🗑️ Deleted persona: {persona["name"]}',
@@ -55,6 +55,13 @@ class Config:
     OPENAI_MAX_TOKENS = int(os.getenv('OPENAI_MAX_TOKENS', '2000'))
     OPENAI_TEMPERATURE = float(os.getenv('OPENAI_TEMPERATURE', '0.7'))
     
+    # Short LinkedIn copy doesn't need the largest model
+    MESSAGE_MODEL = os.getenv('MESSAGE_MODEL', 'gpt-4o-mini')
+    MESSAGE_MODEL_HIGH_QUALITY = os.getenv('MESSAGE_MODEL_HIGH_QUALITY', 'gpt-4')
+    
+    # Persona document analysis returns schema-checked JSON, so the small model is enough
+    PERSONA_MODEL = os.getenv('PERSONA_MODEL', 'gpt-4o-mini')
+    
     # ========================================================================
     # LINKEDIN SETTINGS
     # ========================================================================
@@ -228,7 +228,7 @@ class DatabaseManager:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
-                    SELECT l.*, p.name as persona_name
+                    SELECT l.*, p.name as persona_name, p.description as persona_description
                     FROM leads l
                     LEFT JOIN personas p ON l.persona_id = p.id
                     WHERE l.id = ?
@@ -239,6 +239,26 @@ class DatabaseManager:
             print(f"❌ Error getting lead: {str(e)}")
             return None
     
+    def get_leads_by_ids(self, lead_ids: List[int]) -> Dict[int, Dict]:
+        """Get many leads (with their persona) in one query per 500 IDs, keyed by ID"""
+        leads = {}
+        lead_ids = list(dict.fromkeys(lead_ids))
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                for start in range(0, len(lead_ids), 500):
+                    chunk = lead_ids[start:start + 500]
+                    cursor.execute(f"""
+                        SELECT l.*, p.name as persona_name, p.description as persona_description
+                        FROM leads l
+                        LEFT JOIN personas p ON l.persona_id = p.id
+                        WHERE l.id IN ({', '.join('?' * len(chunk))})
+                    """, chunk)
+                    leads.update((row['id'], dict(row)) for row in cursor.fetchall())
+        except Exception as e:
+            print(f"❌ Error getting leads: {str(e)}")
+        return leads
+    
     def update_lead(self, lead_id: int, updates: Dict) -> bool:
         """Update lead"""
         try:
@@ -302,11 +322,12 @@ class DatabaseManager:
                 
                 cursor.execute("""
                     INSERT INTO messages (
-                        lead_id, message_type, content, variant, prompt_used,
+                        lead_id, ab_test_id, message_type, content, variant, prompt_used,
                         generated_by, status, created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     message_data.get('lead_id'),
+                    message_data.get('ab_test_id'),
                     message_data.get('message_type', 'connection_request'),
                     message_data.get('content'),
                     message_data.get('variant', 'A'),
@@ -323,6 +344,89 @@ class DatabaseManager:
             print(f"❌ Error saving message: {str(e)}")
             return None
     
+    def create_messages_bulk(self, messages: List[Dict], ab_test_id: Optional[int] = None) -> int:
+        """Save many generated messages in a single transaction, optionally tagged with an A/B test"""
+        if not messages:
+            return 0
+        
+        try:
+            with self.get_connection() as conn:
+                return self._insert_messages(conn.cursor(), messages, ab_test_id)
+        
+        except Exception as e:
+            print(f"❌ Error saving messages: {str(e)}")
+            return 0
+    
+    def begin_messages_bulk(self, messages: List[Dict], ab_test_id: Optional[int] = None) -> Optional[sqlite3.Connection]:
+        """
+        Insert messages in a transaction left open for commit_messages_bulk
+        
+        Lets a caller write the first part of a sequence while the rest is still
+        being generated, and commit it all at once. The connection can be
+        finished from another thread; it holds the write lock until then.
+        Returns None if the insert fails.
+        """
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        try:
+            self._insert_messages(conn.cursor(), messages, ab_test_id)
+            return conn
+        except Exception as e:
+            conn.close()
+            print(f"❌ Error saving messages: {str(e)}")
+            return None
+    
+    def commit_messages_bulk(self,
+                             conn: sqlite3.Connection,
+                             messages: List[Dict],
+                             ab_test_id: Optional[int] = None) -> bool:
+        """Insert the rest of the messages on a begin_messages_bulk connection and commit them all (or none)"""
+        try:
+            self._insert_messages(conn.cursor(), messages, ab_test_id)
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error saving messages: {str(e)}")
+            return False
+        finally:
+            conn.close()
+    
+    def rollback_messages_bulk(self, conn: sqlite3.Connection):
+        """Discard the messages inserted on a begin_messages_bulk connection"""
+        try:
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    def _insert_messages(self, cursor, messages: List[Dict], ab_test_id: Optional[int] = None) -> int:
+        """INSERT message rows on `cursor` without committing; returns how many were inserted"""
+        if not messages:
+            return 0
+        
+        now = datetime.now().isoformat()
+        cursor.executemany("""
+            INSERT INTO messages (
+                lead_id, ab_test_id, message_type, content, variant, prompt_used,
+                generated_by, status, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                message_data.get('lead_id'),
+                message_data.get('ab_test_id', ab_test_id),
+                message_data.get('message_type', 'connection_request'),
+                message_data.get('content'),
+                message_data.get('variant', 'A'),
+                message_data.get('prompt_used'),
+                message_data.get('generated_by', 'gpt-4'),
+                message_data.get('status', 'draft'),
+                now,
+                now
+            )
+            for message_data in messages
+        ])
+        
+        return cursor.rowcount
+    
     def get_all_messages(self, status: str = None) -> List[Dict]:
         """Get all messages, optionally filtered by status"""
         try:
@@ -382,6 +486,24 @@ class DatabaseManager:
             print(f"❌ Error getting messages for lead: {str(e)}")
             return []
     
+    def get_lead_ids_with_messages(self, lead_ids: List[int]) -> set:
+        """Which of these leads already have messages, in one query per 500 IDs"""
+        found = set()
+        lead_ids = list(dict.fromkeys(lead_ids))
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                for start in range(0, len(lead_ids), 500):
+                    chunk = lead_ids[start:start + 500]
+                    cursor.execute(f"""
+                        SELECT DISTINCT lead_id FROM messages
+                        WHERE lead_id IN ({', '.join('?' * len(chunk))})
+                    """, chunk)
+                    found.update(row['lead_id'] for row in cursor.fetchall())
+        except Exception as e:
+            print(f"❌ Error checking messages for leads: {str(e)}")
+        return found
+    
     def update_message_status(self, message_id: int, new_status: str) -> bool:
         """Update message status"""
         try:
@@ -0,0 +1,97 @@
+"""
+Test bulk message saving and the batched lead lookups
+Runs against a throwaway database, never data/database.db
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.database.db_manager import DatabaseManager
+from scripts.testing_utils import make_temp_db
+
+# More than two 500-ID chunks, and over SQLite's old 999-variable limit
+LEAD_COUNT = 1203
+
+
+def add_leads(db: DatabaseManager, count: int) -> list:
+    """Insert `count` leads under one persona and return their IDs"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO personas (name, description) VALUES (?, ?)", ('Founders', 'Early-stage founders'))
+        persona_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO leads (name, title, company, persona_id) VALUES (?, ?, ?, ?)",
+            [(f'Lead {i}', 'CEO', f'Company {i}', persona_id) for i in range(count)]
+        )
+        return [row['id'] for row in cursor.execute("SELECT id FROM leads ORDER BY id")]
+
+
+def test_get_leads_by_ids():
+    """Every lead comes back, with its persona, across several chunks"""
+    print("\n📊 Test: get_leads_by_ids")
+    print("-"*60)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        db = make_temp_db(directory)
+        lead_ids = add_leads(db, LEAD_COUNT)
+        
+        # Duplicates and unknown IDs are fine
+        leads = db.get_leads_by_ids(lead_ids + lead_ids[:10] + [999999])
+        
+        assert set(leads) == set(lead_ids), f"expected {len(lead_ids)} leads, got {len(leads)}"
+        assert all(lead['persona_name'] == 'Founders' for lead in leads.values())
+        assert db.get_leads_by_ids([]) == {}
+        print(f"✅ Fetched {len(leads)} leads in {-(-len(lead_ids) // 500)} chunks")
+
+
+def test_create_messages_bulk():
+    """Bulk insert saves every row and the lookup finds exactly those leads"""
+    print("\n💾 Test: create_messages_bulk / get_lead_ids_with_messages")
+    print("-"*60)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        db = make_temp_db(directory)
+        lead_ids = add_leads(db, LEAD_COUNT)
+        with_messages = lead_ids[::2]
+        
+        rows = [
+            {
+                'lead_id': lead_id,
+                'message_type': 'connection_request',
+                'content': f'Hi there, variant {variant}',
+                'variant': variant,
+                'generated_by': 'gpt-4o-mini'
+            }
+            for lead_id in with_messages
+            for variant in ('A', 'B', 'C')
+        ]
+        saved = db.create_messages_bulk(rows, ab_test_id=7)
+        
+        assert saved == len(rows), f"expected {len(rows)} rows saved, got {saved}"
+        assert db.create_messages_bulk([]) == 0
+        
+        with db.get_connection() as conn:
+            stored = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT lead_id), MIN(ab_test_id), MAX(ab_test_id) FROM messages WHERE generated_by = 'gpt-4o-mini' AND status = 'draft'"
+            ).fetchone()
+        assert tuple(stored) == (len(rows), len(with_messages), 7, 7), tuple(stored)
+        
+        found = db.get_lead_ids_with_messages(lead_ids)
+        assert found == set(with_messages), f"expected {len(with_messages)} leads with messages, got {len(found)}"
+        print(f"✅ Saved {saved} messages for {len(found)} leads")
+
+
+if __name__ == '__main__':
+    print("="*60)
+    print("🧪 MESSAGE DATABASE TEST")
+    print("="*60)
+    
+    test_get_leads_by_ids()
+    test_create_messages_bulk()
+    
+    print("\n" + "="*60)
+    print("✅ All tests passed!")
+    print("="*60)
@@ -0,0 +1,158 @@
+"""
+Test MessageGenerator against a local OpenAI-compatible server
+No API key or network access needed; messages go to a throwaway database
+"""
+
+import asyncio
+import contextlib
+import logging
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.ai_engine import message_generator
+from backend.ai_engine.message_generator import MessageGenerator, PREMIUM_PERSONA_CHARS
+from backend.database.db_manager import DatabaseManager
+from scripts.testing_utils import StubOpenAIHandler, make_temp_db, stub_openai_server
+
+PREMIUM_MODEL = 'gpt-4o'
+LONG_PERSONA = 'Series A fintech founders scaling their go-to-market team. ' * 10
+SHORT_PERSONA = 'Fintech founders'
+
+
+def add_lead(db: DatabaseManager, name: str, persona_description: str) -> int:
+    """Insert a lead with its own persona and return the lead ID"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO personas (name, description) VALUES (?, ?)", ('Fintech Founders', persona_description))
+        cursor.execute(
+            "INSERT INTO leads (name, title, company, persona_id) VALUES (?, ?, ?, ?)",
+            (name, 'CEO', 'Acme Corp', cursor.lastrowid)
+        )
+        return cursor.lastrowid
+
+
+@contextlib.contextmanager
+def generator_env(directory: str):
+    """Point the generator at the stub server and a throwaway database"""
+    db = make_temp_db(directory)
+    lazy_db = message_generator._lazy_db
+    message_generator._lazy_db = lambda: db
+    try:
+        with stub_openai_server():
+            yield db
+    finally:
+        message_generator._lazy_db = lazy_db
+
+
+def saved_models(db: DatabaseManager, lead_id: int) -> dict:
+    """generated_by per message type for a lead's saved messages"""
+    with db.get_connection() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT message_type, generated_by FROM messages WHERE lead_id = ?", (lead_id,)
+        ).fetchall()
+    return {row['message_type']: row['generated_by'] for row in rows}
+
+
+def test_generated_by_routing():
+    """generated_by is the model that wrote each message type, or 'fallback' for canned copy"""
+    print("\n🔀 Test: generated_by Records the Routed Model")
+    print("-"*60)
+    
+    assert len(LONG_PERSONA) > PREMIUM_PERSONA_CHARS >= len(SHORT_PERSONA)
+    
+    with tempfile.TemporaryDirectory() as directory, generator_env(directory) as db:
+        premium_lead = add_lead(db, 'Jane Doe', LONG_PERSONA)
+        draft_lead = add_lead(db, 'Tom Smith', SHORT_PERSONA)
+        bulk_leads = [add_lead(db, 'Ann Lee', LONG_PERSONA), add_lead(db, 'Bob Ray', SHORT_PERSONA)]
+        
+        generator = MessageGenerator(api_key='sk-test', premium_model=PREMIUM_MODEL)
+        assert generator.route_model(LONG_PERSONA) == PREMIUM_MODEL
+        assert generator.route_model(SHORT_PERSONA) == generator.model
+        assert generator.route_model(SHORT_PERSONA, custom_context='Mention the webinar') == PREMIUM_MODEL
+        
+        generator.generate_all_messages(premium_lead)
+        generator.generate_all_messages(draft_lead)
+        results = asyncio.run(generator.generate_messages_bulk(bulk_leads))
+        assert set(results) == set(bulk_leads), results
+        
+        for lead_id, routed in ((premium_lead, PREMIUM_MODEL), (draft_lead, generator.model)):
+            expected = {'connection_request': routed, 'follow_up_1': generator.model, 'follow_up_2': generator.model}
+            assert saved_models(db, lead_id) == expected, saved_models(db, lead_id)
+        print(f"✅ generate_all_messages: {PREMIUM_MODEL} for the long persona, {generator.model} otherwise")
+        
+        for lead_id, routed in zip(bulk_leads, (PREMIUM_MODEL, generator.model)):
+            assert saved_models(db, lead_id)['connection_request'] == routed, saved_models(db, lead_id)
+        print("✅ generate_messages_bulk records the routed model too")
+        
+        # What was saved matches what was actually requested
+        requested = [request['model'] for request in StubOpenAIHandler.requests]
+        assert requested.count(PREMIUM_MODEL) == 2, requested
+        
+        # Canned copy after a failed call is not credited to the model
+        StubOpenAIHandler.failing_models.add(PREMIUM_MODEL)
+        fallback_lead = add_lead(db, 'Cam Diaz', LONG_PERSONA)
+        generator.generate_all_messages(fallback_lead)
+        expected = {'connection_request': 'fallback', 'follow_up_1': generator.model, 'follow_up_2': generator.model}
+        assert saved_models(db, fallback_lead) == expected, saved_models(db, fallback_lead)
+        print("✅ Fallback copy is saved as generated_by 'fallback'")
+
+
+class _RecordList(logging.Handler):
+    """Keeps every record it is given"""
+    
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.records = []
+    
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_sequential_runs():
+    """Back-to-back runs on one generator don't reuse connections from a closed event loop"""
+    print("\n🔁 Test: Sequential Runs on One Generator")
+    print("-"*60)
+    
+    handler = _RecordList()
+    logger = logging.getLogger(message_generator.__name__)
+    logger.addHandler(handler)
+    try:
+        with tempfile.TemporaryDirectory() as directory, generator_env(directory) as db:
+            lead_id = add_lead(db, 'Jane Doe', SHORT_PERSONA)
+            generator = MessageGenerator(api_key='sk-test')
+            
+            # The sync wrapper twice, then the async version under two separate asyncio.run() loops
+            runs = [generator.generate_all_messages(lead_id) for _ in range(2)]
+            runs += [asyncio.run(generator.generate_all_messages_async(lead_id)) for _ in range(2)]
+    finally:
+        logger.removeHandler(handler)
+    
+    problems = [record.getMessage() for record in handler.records]
+    assert not problems, problems
+    print("✅ No connection errors, retries or fallbacks logged")
+    
+    # One request per message type per run, all answered by the server
+    assert len(StubOpenAIHandler.requests) == 3 * len(runs), len(StubOpenAIHandler.requests)
+    for messages in runs:
+        assert all(
+            content.startswith('Hi there, option')
+            for variants in messages.values()
+            for content in variants.values()
+        ), messages
+    print(f"✅ {len(runs)} runs, {len(StubOpenAIHandler.requests)} requests, every message from the server")
+
+
+if __name__ == '__main__':
+    print("="*60)
+    print("🧪 MESSAGE GENERATOR TEST")
+    print("="*60)
+    
+    test_generated_by_routing()
+    test_sequential_runs()
+    
+    print("\n" + "="*60)
+    print("✅ All tests passed!")
+    print("="*60)
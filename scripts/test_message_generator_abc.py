@@ -0,0 +1,203 @@
+"""
+Test ABCMessageGenerator batches against a local OpenAI-compatible server
+No API key or network access needed; variants go to a throwaway database
+"""
+
+import asyncio
+import contextlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.ai_engine import message_generator_abc
+from backend.ai_engine.message_generator import _RateLimiter, _async_openai_client
+from backend.ai_engine.message_generator_abc import ABCMessageGenerator
+from backend.database.db_manager import DatabaseManager
+from scripts.testing_utils import StubOpenAIHandler, make_temp_db, stub_openai_server
+
+MISSING_LEAD_ID = 999999
+
+
+def add_leads(db: DatabaseManager, leads: list) -> list:
+    """Insert (name, title, company) leads under one persona and return their IDs"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO personas (name, description) VALUES (?, ?)", ('Fintech Founders', 'Fintech founders'))
+        persona_id = cursor.lastrowid
+        lead_ids = []
+        for name, title, company in leads:
+            cursor.execute(
+                "INSERT INTO leads (name, title, company, persona_id) VALUES (?, ?, ?, ?)",
+                (name, title, company, persona_id)
+            )
+            lead_ids.append(cursor.lastrowid)
+        return lead_ids
+
+
+@contextlib.contextmanager
+def abc_env(directory: str):
+    """Point the ABC generator at the stub server and a throwaway database"""
+    db = make_temp_db(directory)
+    db_manager = message_generator_abc.db_manager
+    message_generator_abc.db_manager = db
+    try:
+        with stub_openai_server():
+            yield db
+    finally:
+        message_generator_abc.db_manager = db_manager
+
+
+def saved_variants(db: DatabaseManager) -> dict:
+    """Variant A row (content, generated_by, prompt_used) per lead"""
+    with db.get_connection() as conn:
+        rows = conn.execute(
+            "SELECT lead_id, content, generated_by, prompt_used FROM messages WHERE variant = 'A'"
+        ).fetchall()
+    return {row['lead_id']: (row['content'], row['generated_by'], row['prompt_used']) for row in rows}
+
+
+def test_batch_generate():
+    """Variants are saved per lead; look-alike leads share one call and sparse leads get no call"""
+    print("\n📦 Test: batch_generate Saves and Reuses Variants")
+    print("-"*60)
+    
+    with tempfile.TemporaryDirectory() as directory, abc_env(directory) as db:
+        jane, tom, ann, sparse, existing = add_leads(db, [
+            ('Jane Doe', 'CEO', 'Acme Corp'),
+            ('Tom Smith', 'CEO', 'Acme Corp'),
+            ('Ann Lee', 'CTO', 'Globex'),
+            ('Bo', None, None),
+            ('Eve Stone', 'CFO', 'Initech')
+        ])
+        db.create_messages_bulk([{'lead_id': existing, 'message_type': 'connection_request', 'content': 'Hi Eve'}])
+        
+        generator = ABCMessageGenerator(api_key='sk-test')
+        results = generator.batch_generate([jane, tom, ann, sparse, existing, MISSING_LEAD_ID], max_leads=10)
+        
+        assert results['successful'] == 4 and results['failed'] == 2, results
+        assert results['messages_created'] == 12 and results['skipped_empty'] == 1, results
+        assert sorted(results['lead_ids_processed']) == [jane, tom, ann, sparse], results
+        assert results['retries'] == 0, results
+        print(f"✅ {results['successful']} leads saved, {results['failed']} skipped (existing messages, not found)")
+        
+        # Tom has Jane's title, company and persona, and the sparse lead needs no call
+        assert len(StubOpenAIHandler.requests) == 2, len(StubOpenAIHandler.requests)
+        
+        saved = saved_variants(db)
+        assert saved[jane] == (f"Hi Jane, option 0 variant_a from {generator.model}.", generator.model, 'ABC variant A')
+        assert saved[tom] == (f"Hi Tom, option 0 variant_a from {generator.model}.", generator.model,
+                              f'ABC variant A (reused from lead {jane})'), saved[tom]
+        assert saved[sparse][1] == 'fallback', saved[sparse]
+        with db.get_connection() as conn:
+            existing_count = conn.execute("SELECT COUNT(*) FROM messages WHERE lead_id = ?", (existing,)).fetchone()[0]
+        assert existing_count == 1, existing_count
+        print("✅ 2 API calls for 4 leads; Tom's copy of Jane's variants is addressed to Tom")
+
+
+def test_multi_lead_requests():
+    """leads_per_request groups leads into one call each and saves every lead's own variants"""
+    print("\n👥 Test: Several Leads per Request")
+    print("-"*60)
+    
+    with tempfile.TemporaryDirectory() as directory, abc_env(directory) as db:
+        lead_ids = add_leads(db, [(f'Lead {i}', f'Title {i}', f'Company {i}') for i in range(5)])
+        
+        generator = ABCMessageGenerator(api_key='sk-test')
+        results = generator.batch_generate(lead_ids, leads_per_request=2)
+        
+        assert results['successful'] == 5 and results['messages_created'] == 15, results
+        requests = StubOpenAIHandler.requests
+        assert len(requests) == 3, len(requests)
+        assert all(request['response_format']['json_schema']['name'] == 'lead_variants' for request in requests)
+        
+        saved = saved_variants(db)
+        for lead_id in lead_ids:
+            assert saved[lead_id][:2] == (f"Hi, option 0 variant_a for lead {lead_id}.", generator.model), saved[lead_id]
+        print(f"✅ {len(lead_ids)} leads in {len(requests)} requests, each with its own variants")
+
+
+def test_batch_api():
+    """A Batch API run saves the variants from the batch output file"""
+    print("\n🗂️ Test: Batch API Generation")
+    print("-"*60)
+    
+    with tempfile.TemporaryDirectory() as directory, abc_env(directory) as db:
+        lead_ids = add_leads(db, [('Jane Doe', 'CEO', 'Acme Corp'), ('Ann Lee', 'CTO', 'Globex')])
+        
+        generator = ABCMessageGenerator(api_key='sk-test')
+        results = generator.batch_generate(lead_ids + [MISSING_LEAD_ID], use_batch_api=True, ab_test_id=3)
+        
+        assert results['successful'] == 2 and results['failed'] == 1, results
+        assert results['messages_created'] == 6, results
+        assert len(StubOpenAIHandler.requests) == 2, len(StubOpenAIHandler.requests)
+        
+        saved = saved_variants(db)
+        assert saved[lead_ids[1]][:2] == (f"Hi Ann, option 0 variant_a from {generator.model}.", generator.model)
+        with db.get_connection() as conn:
+            ab_test_ids = {row[0] for row in conn.execute("SELECT ab_test_id FROM messages")}
+        assert ab_test_ids == {3}, ab_test_ids
+        print(f"✅ {results['messages_created']} messages saved from one batch job")
+
+
+def test_in_flight_requests():
+    """Identical requests on one client share a call, and a cancelled caller doesn't cancel it"""
+    print("\n🔗 Test: Shared In-Flight Requests")
+    print("-"*60)
+    
+    lead = {'id': 1, 'name': 'Jane Doe', 'title': 'CEO', 'company': 'Acme Corp'}
+    
+    async def run(generator):
+        async with _async_openai_client(generator.api_key) as aclient:
+            callers = [asyncio.ensure_future(generator.agenerate_variants(lead, aclient=aclient)) for _ in range(3)]
+            await asyncio.sleep(0)
+            callers[0].cancel()
+            return await asyncio.gather(*callers[1:])
+    
+    with stub_openai_server():
+        generator = ABCMessageGenerator(api_key='sk-test')
+        results = asyncio.run(run(generator))
+    
+    assert len(StubOpenAIHandler.requests) == 1, len(StubOpenAIHandler.requests)
+    assert all(variants['variant_a'] == f"Hi Jane, option 0 variant_a from {generator.model}." for variants in results), results
+    assert not any(generator._in_flight.values()), generator._in_flight
+    print("✅ 3 callers, 1 request; the others still got the variants after one was cancelled")
+
+
+def test_rate_limiter():
+    """Calls wait for token capacity to refill instead of going over the limit"""
+    print("\n⏱️ Test: Rate Limiter")
+    print("-"*60)
+    
+    async def run():
+        # 6000 tokens per minute refill at 100 per second
+        limiter = _RateLimiter(requests_per_minute=600, tokens_per_minute=6000)
+        start = time.monotonic()
+        # More than the whole budget is capped to it instead of waiting forever
+        await limiter.acquire(10**9)
+        drained = time.monotonic() - start
+        await limiter.acquire(50)
+        return drained, time.monotonic() - start
+    
+    drained, waited = asyncio.run(run())
+    assert drained < 0.1, drained
+    assert 0.4 <= waited < 2, waited
+    print(f"✅ Full budget at once, then waited {waited:.2f}s for 50 more tokens")
+
+
+if __name__ == '__main__':
+    print("="*60)
+    print("🧪 ABC MESSAGE GENERATOR TEST")
+    print("="*60)
+    
+    test_batch_generate()
+    test_multi_lead_requests()
+    test_batch_api()
+    test_in_flight_requests()
+    test_rate_limiter()
+    
+    print("\n" + "="*60)
+    print("✅ All tests passed!")
+    print("="*60)
@@ -0,0 +1,169 @@
+"""
+Shared helpers for the scripts/test_*.py checks
+A throwaway database and a local OpenAI-compatible server, so no API key or network access is needed
+"""
+
+import contextlib
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from backend.database.models import Base
+from backend.database.db_manager import DatabaseManager
+
+# "Lead 12:" headers of a multi-lead prompt and the first name line of a single-lead one
+_LEAD_HEADER_RE = re.compile(r'^Lead (\d+):$', re.MULTILINE)
+_FIRST_NAME_RE = re.compile(r'^- First Name: (.*)$', re.MULTILINE)
+
+VARIANT_KEYS = ('variant_a', 'variant_b', 'variant_c')
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    Answers chat completions, and Batch API jobs made of them, and records each request
+    
+    Plain requests get `n` canned choices. Requests with the 'variants' or
+    'lead_variants' JSON schema get variants addressed to the lead's first
+    name, or to each lead ID of a multi-lead prompt.
+    """
+    
+    protocol_version = 'HTTP/1.1'
+    requests = []
+    # Requests for these models get a 400, so the generator falls back
+    failing_models = set()
+    # Uploaded batch input files and finished batch output files, by file ID
+    files = {}
+    
+    def log_message(self, *args):
+        pass
+    
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers['Content-Length']))
+        
+        if self.path == '/v1/files':
+            # The multipart body carries the JSONL file with one request per line
+            lines = [line for line in raw.decode().splitlines() if line.startswith('{"custom_id"')]
+            file_id = f'file-{len(self.files)}'
+            self.files[file_id] = lines
+            self._send_json({'id': file_id, 'object': 'file', 'bytes': len(raw), 'created_at': 0,
+                             'filename': 'requests.jsonl', 'purpose': 'batch', 'status': 'processed'})
+            return
+        
+        body = json.loads(raw)
+        if self.path == '/v1/batches':
+            # Finished at once: every request of the input file is answered
+            output = []
+            for line in self.files[body['input_file_id']]:
+                item = json.loads(line)
+                self.requests.append(item['body'])
+                output.append(json.dumps({
+                    'id': f"response-{item['custom_id']}",
+                    'custom_id': item['custom_id'],
+                    'response': {'status_code': 200, 'body': self._completion(item['body'])},
+                    'error': None
+                }))
+            output_id = f'file-{len(self.files)}'
+            self.files[output_id] = output
+            self._send_json({'id': 'batch-test', 'object': 'batch', 'endpoint': body['endpoint'],
+                             'input_file_id': body['input_file_id'], 'completion_window': body['completion_window'],
+                             'status': 'completed', 'output_file_id': output_id, 'created_at': 0})
+            return
+        
+        self.requests.append(body)
+        if body['model'] in self.failing_models:
+            self._send_json({'error': {'message': 'model unavailable', 'type': 'invalid_request_error'}}, status=400)
+            return
+        self._send_json(self._completion(body))
+    
+    def do_GET(self):
+        # Batch output download: /v1/files/<id>/content
+        file_id = self.path.split('/')[3]
+        content = '\n'.join(self.files[file_id]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+    
+    @staticmethod
+    def _completion(body: dict) -> dict:
+        """Chat completion response for a request body"""
+        schema = (body.get('response_format') or {}).get('json_schema', {}).get('name')
+        prompt = body['messages'][-1]['content']
+        
+        def content(i: int) -> str:
+            if schema == 'lead_variants':
+                return json.dumps({'leads': [
+                    {'lead_id': int(lead_id), **{key: f"Hi, option {i} {key} for lead {lead_id}." for key in VARIANT_KEYS}}
+                    for lead_id in _LEAD_HEADER_RE.findall(prompt)
+                ]})
+            if schema == 'variants':
+                match = _FIRST_NAME_RE.search(prompt)
+                first_name = match.group(1) if match else 'there'
+                return json.dumps({key: f"Hi {first_name}, option {i} {key} from {body['model']}." for key in VARIANT_KEYS})
+            return f"Hi there, option {i} from {body['model']}."
+        
+        return {
+            'id': 'chatcmpl-test',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': body['model'],
+            'choices': [
+                {
+                    'index': i,
+                    'message': {'role': 'assistant', 'content': content(i)},
+                    'finish_reason': 'stop'
+                }
+                for i in range(body.get('n', 1))
+            ],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 10, 'total_tokens': 20}
+        }
+    
+    def _send_json(self, payload: dict, status: int = 200):
+        response = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+
+def start_stub_server() -> ThreadingHTTPServer:
+    """Serve StubOpenAIHandler in the background"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenAIHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@contextlib.contextmanager
+def stub_openai_server():
+    """Point OPENAI_BASE_URL at a fresh stub server, with its request log cleared"""
+    base_url = os.environ.get('OPENAI_BASE_URL')
+    server = start_stub_server()
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    StubOpenAIHandler.requests.clear()
+    StubOpenAIHandler.failing_models.clear()
+    StubOpenAIHandler.files.clear()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        if base_url is None:
+            os.environ.pop('OPENAI_BASE_URL', None)
+        else:
+            os.environ['OPENAI_BASE_URL'] = base_url
+
+
+def make_temp_db(directory: str) -> DatabaseManager:
+    """DatabaseManager on a fresh database with every table created"""
+    db_path = Path(directory) / 'test.db'
+    engine = create_engine(f'sqlite:///{db_path}')
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    return DatabaseManager(db_path=str(db_path))